@@ -0,0 +1,322 @@
+"""
+Strat benchmark: drives a Strat subclass through N synthetic candles x R routes with scripted
+position opens, adds and closes, on the Binance and Bybit tier paths.
+
+Every scenario runs in a fresh process (cold caches, clean memory) against the Jesse stand-in
+and measures import time, startup (strategy init + run_once: rules, brackets, risk limits),
+per candle overhead and peak memory. Results are saved as JSON, --compare reports regressions.
+
+    python benchmarks/bench_strat.py --candles 5000 --routes 1,4 --out bench.json
+    python benchmarks/bench_strat.py --compare bench.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SYMBOLS = ["BTC", "ETH", "BNB", "SOL", "XRP", "ADA", "DOGE", "LTC"]
+START_PRICES = [20000.0, 1500.0, 300.0, 25.0, 0.5, 0.3, 0.07, 90.0]
+
+EXCHANGES = {
+    "binance": "Binance Perpetual Futures",
+    "bybit": "Bybit USDT Perpetual",
+}
+
+# Compared by --compare, lower is better.
+METRICS = ("import_ms", "startup_ms", "per_candle_us", "per_route_candle_us", "peak_kb")
+
+# Scripted position cycle (candle index within the cycle -> action).
+CYCLE = 240
+OPEN, ADD, ADD2, CLOSE = 10, 80, 150, 220
+
+
+def write_exchange_files(symbols):
+    """Synthetic exchange info and Bybit risk limits in the current directory, nothing is downloaded."""
+    from strat.brackets import extend_bybit_tiers
+
+    binance = {"serverTime": 0, "symbols": []}
+    bybit = {"ret_msg": "OK", "result": []}
+    risk_limits = {}
+
+    for symbol in symbols:
+        binance["symbols"].append(
+            {
+                "symbol": symbol,
+                "pricePrecision": 6,
+                "quantityPrecision": 3,
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "tickSize": "0.000001"},
+                    {"filterType": "LOT_SIZE", "minQty": "0.001", "stepSize": "0.001"},
+                    {"filterType": "MARKET_LOT_SIZE", "minQty": "0.001", "stepSize": "0.001"},
+                    {"filterType": "MIN_NOTIONAL", "notional": "5"},
+                ],
+            }
+        )
+        bybit["result"].append(
+            {"name": symbol, "price_scale": 6, "lot_size_filter": {"qty_step": 0.001, "min_trading_qty": 0.001}}
+        )
+        base = [
+            {"id": 1, "symbol": symbol, "limit": 2000000.0, "maintain_margin": 0.005, "starting_margin": 0.01,
+             "is_lowest_risk": 1, "max_leverage": 100.0},
+            {"id": 2, "symbol": symbol, "limit": 4000000.0, "maintain_margin": 0.01, "starting_margin": 0.0175,
+             "is_lowest_risk": 0, "max_leverage": 57.14},
+        ]
+        risk_limits[symbol] = extend_bybit_tiers(base)
+
+    for fname, data in (
+        ("BinancePerpetualFuturesExchangeInfo.json", binance),
+        ("BybitUSDTPerpetualExchangeInfo.json", bybit),
+        ("BybitPerpetualExchangeInfo.json", bybit),
+    ):
+        with open(fname, "w") as f:
+            json.dump(data, f)
+
+    os.makedirs("bybit", exist_ok=True)
+    with open("bybit/risk-limits.json", "w") as f:
+        json.dump({"updated": 0, "source": "bench", "symbols": risk_limits}, f)
+
+
+def price_paths(routes, candles, seed):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0, 0.004, size=(routes, candles))
+    return np.asarray(START_PRICES[:routes])[:, None] * np.exp(np.cumsum(steps, axis=1))
+
+
+def run_scenario(exchange, routes, candles, seed, memory, profile):
+    """One scenario in this process, returns its metrics."""
+    sys.path.insert(0, str(ROOT))
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    import jesse_standin
+
+    jesse_standin.install()
+
+    workdir = tempfile.mkdtemp(prefix="strat-bench-")
+    os.chdir(workdir)
+
+    exchange_name = EXCHANGES[exchange]
+    symbols = SYMBOLS[:routes]
+    jesse_standin.Strategy.ROUTES = [(exchange_name, f"{s}-USDT") for s in symbols]
+    jesse_standin.Strategy.SHARED_VARS = {}
+
+    if memory:
+        tracemalloc.start()
+
+    t = time.perf_counter()
+    import strat
+    from strat.profiling import profiler
+
+    import_ms = (time.perf_counter() - t) * 1e3
+
+    write_exchange_files([f"{s}USDT" for s in symbols])
+    paths = price_paths(routes, candles, seed)
+
+    class BenchStrat(strat.Strat):
+        div = 1
+        cycle_pos_size = 0
+        max_cycle_entry_recorded = 0
+        total_positions = 0
+        last_trade_ts = 0
+
+        def step(self):
+            """What a typical strategy asks Strat for every candle."""
+            self.before()
+            self.update_shared_vars("bench")
+            self.margin_threshold_reached("bench")
+            self.lp_rate()
+            self.check_breakeven_or_killswitch("bench")
+
+    timeframe = 300000
+
+    t = time.perf_counter()
+    strategies = []
+    for r, symbol in enumerate(symbols):
+        s = BenchStrat()
+        s.exchange = exchange_name
+        s.symbol = f"{symbol}-USDT"
+        s.leverage = 5
+        s.profile_enabled = profile
+        p = float(paths[r, 0])
+        s.candles = [[0, p, p, p, p, 1], [timeframe, p, p, p, p, 1]]
+        strategies.append(s)
+    for s in strategies:
+        s.run_once()
+    startup_ms = (time.perf_counter() - t) * 1e3
+
+    t = time.perf_counter()
+    for i in range(candles):
+        ts = (i + 2) * timeframe
+        phase = i % CYCLE
+        for r, s in enumerate(strategies):
+            p = float(paths[r, i])
+            s.candles = [s.candles[-1], [ts, p, p, p * 1.002, p * 0.998, 1]]
+
+            position = s.position
+            if phase == OPEN:
+                position.qty = s.balance * s.leverage * 0.1 / p
+                position.entry_price = p
+            elif phase in (ADD, ADD2) and position.qty:
+                add = position.qty if phase == ADD else position.qty * 2
+                position.entry_price = (position.entry_price * position.qty + p * add) / (position.qty + add)
+                position.qty += add
+            elif phase == CLOSE:
+                position.qty = 0.0
+                position.entry_price = None
+
+            s.step()
+    loop_s = time.perf_counter() - t
+
+    result = {
+        "exchange": exchange,
+        "routes": routes,
+        "candles": candles,
+        "import_ms": import_ms,
+        "startup_ms": startup_ms,
+        "per_candle_us": loop_s / candles * 1e6,
+        "per_route_candle_us": loop_s / (candles * routes) * 1e6,
+    }
+
+    if memory:
+        result["peak_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+
+    if profile:
+        result["profile"] = profiler.rows()
+
+    os.chdir(ROOT)
+    shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def spawn(exchange, routes, candles, seed, memory, profile):
+    cmd = [
+        sys.executable,
+        __file__,
+        "--worker",
+        json.dumps({"exchange": exchange, "routes": routes, "candles": candles, "seed": seed,
+                    "memory": memory, "profile": profile}),
+    ]
+    out = subprocess.run(cmd, capture_output=True, text=True, cwd=ROOT)
+    if out.returncode != 0:
+        raise RuntimeError(f"Benchmark worker failed ({exchange}, {routes} routes):\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=ROOT
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_all(args):
+    results = {}
+    for exchange in args.exchanges:
+        for routes in args.routes:
+            key = f"{exchange}-r{routes}-c{args.candles}"
+            runs = [spawn(exchange, routes, args.candles, args.seed, False, False) for _ in range(args.repeat)]
+            # Best of n for timings, memory from a separate traced run (tracing slows everything down).
+            best = {m: min(r[m] for r in runs) for m in METRICS if m != "peak_kb"}
+            mem = spawn(exchange, routes, args.candles, args.seed, True, False)
+            results[key] = {**runs[0], **best, "peak_kb": mem["peak_kb"]}
+            if args.profile:
+                results[key]["profile"] = spawn(exchange, routes, args.candles, args.seed, False, True)["profile"]
+            print_row(key, results[key])
+
+    return {
+        "meta": {
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+
+def print_row(key, r):
+    print(
+        f"{key:<24}| import {r['import_ms']:8.1f} ms | startup {r['startup_ms']:8.1f} ms | "
+        f"{r['per_candle_us']:8.1f} us/candle | {r['per_route_candle_us']:8.1f} us/route/candle | "
+        f"peak {r['peak_kb']:9.0f} KB"
+    )
+
+
+def compare(baseline, current, threshold):
+    """Print new/old ratios of the shared scenarios, returns the number of regressions."""
+    regressions = 0
+    print(f"\nCompared to {baseline['meta'].get('git')} (threshold {threshold:.0%}):")
+    for key, new in current["results"].items():
+        old = baseline["results"].get(key)
+        if old is None:
+            continue
+        cells = []
+        for m in METRICS:
+            if m not in old or m not in new or not old[m]:
+                continue
+            ratio = new[m] / old[m]
+            flag = ""
+            if ratio > 1 + threshold:
+                flag = " !"
+                regressions += 1
+            cells.append(f"{m} x{ratio:0.2f}{flag}")
+        print(f"{key:<24}| " + ", ".join(cells))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candles", type=int, default=5000)
+    parser.add_argument("--routes", default="1,4", help="comma separated route counts (max 8)")
+    parser.add_argument("--exchanges", default="binance,bybit")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--profile", action="store_true", help="include Strat's own profile (strat.profiling)")
+    parser.add_argument("--out", help="save results as json")
+    parser.add_argument("--compare", help="baseline json to compare with")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown before a regression is reported")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        params = json.loads(args.worker)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            result = run_scenario(**params)
+        print(json.dumps(result))
+        return 0
+
+    args.routes = [min(int(r), len(SYMBOLS)) for r in args.routes.split(",")]
+    args.exchanges = [e.strip() for e in args.exchanges.split(",")]
+
+    current = run_all(args)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"\nResults saved to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, current, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
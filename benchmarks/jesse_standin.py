@@ -0,0 +1,144 @@
+"""
+Minimal stand-in for the parts of Jesse that Strat touches, so Strat can be driven
+outside a Jesse backtest: jesse.strategies (Strategy, cached), jesse.helpers (is_live)
+and jesse.utils (size_to_qty). install() registers it in sys.modules before strat is imported.
+"""
+import math
+import sys
+import types
+
+LIVE = False
+
+
+def is_live():
+    return LIVE
+
+
+def cached(fn):
+    return fn
+
+
+def size_to_qty(position_size, entry_price, precision=3, fee_rate=0):
+    if math.isnan(position_size) or math.isnan(entry_price):
+        raise TypeError()
+    if fee_rate != 0:
+        position_size = position_size * (1 - fee_rate * 3)
+    return math.floor((position_size / entry_price) * 10**precision) / 10**precision
+
+
+class Route:
+    def __init__(self, exchange, symbol):
+        self.exchange = exchange
+        self.symbol = symbol
+
+
+class Position:
+    def __init__(self, strategy):
+        self.strategy = strategy
+        self.qty = 0.0
+        self.entry_price = None
+        self.id = "bench"
+
+    @property
+    def value(self):
+        return abs(self.qty) * self.strategy.close
+
+    @property
+    def pnl(self):
+        if not self.qty:
+            return 0.0
+        return (self.strategy.close - self.entry_price) * self.qty
+
+    @property
+    def pnl_percentage(self):
+        if not self.qty:
+            return 0.0
+        return self.pnl / (abs(self.qty) * self.entry_price) * 100 * self.strategy.leverage
+
+
+class Strategy:
+    """Route settings are class level, set by the harness before the strategies are created."""
+
+    ROUTES = [("Binance Perpetual Futures", "BTC-USDT")]
+    SHARED_VARS = {}
+
+    def __init__(self, exchange="Binance Perpetual Futures", symbol="BTC-USDT"):
+        self.shared_vars = self.SHARED_VARS
+        self.vars = {}
+        self.exchange = exchange
+        self.symbol = symbol
+        self.routes = [Route(e, s) for e, s in self.ROUTES]
+        self.timeframe = "5m"
+        self.leverage = 1
+        self.fee_rate = 0.0004
+        self.balance = 10000.0
+        self.candles = []
+        self.position = Position(self)
+        self.hp = {}
+        self.metrics = {}
+        self.trades = []
+        self.orders = []
+
+    @property
+    def current_candle(self):
+        return self.candles[-1]
+
+    @property
+    def close(self):
+        return self.candles[-1][2]
+
+    @property
+    def price(self):
+        return self.candles[-1][2]
+
+    @property
+    def high(self):
+        return self.candles[-1][3]
+
+    @property
+    def low(self):
+        return self.candles[-1][4]
+
+    @property
+    def is_open(self):
+        return self.position.qty != 0
+
+    @property
+    def is_long(self):
+        return self.position.qty > 0
+
+    @property
+    def is_short(self):
+        return self.position.qty < 0
+
+    @property
+    def average_entry_price(self):
+        return self.position.entry_price
+
+    @property
+    def available_margin(self):
+        return self.balance * self.leverage - self.position.value
+
+    def log(self, msg, **kwargs):
+        pass
+
+    def terminate(self):
+        pass
+
+
+def install():
+    """Register the stand-in as the jesse package."""
+    jesse = types.ModuleType("jesse")
+    strategies = types.ModuleType("jesse.strategies")
+    helpers = types.ModuleType("jesse.helpers")
+    utils = types.ModuleType("jesse.utils")
+
+    strategies.Strategy = Strategy
+    strategies.cached = cached
+    helpers.is_live = is_live
+    utils.size_to_qty = size_to_qty
+
+    jesse.strategies, jesse.helpers, jesse.utils = strategies, helpers, utils
+    sys.modules.update(
+        {"jesse": jesse, "jesse.strategies": strategies, "jesse.helpers": helpers, "jesse.utils": utils}
+    )
@@ -12,4 +12,5 @@ setup(
     entry_points=None,
     python_requires='>=3.7',
     include_package_data=True,
+    package_data={"strat": ["Binance_lev_brackets.json", "Binance_lev_brackets.bin"]},
 )
@@ -2,15 +2,29 @@ import math
 import os
 import sys
 import datetime
+import time
 from math import log2, log10
 import json
-from jesse.strategies import Strategy as Vanilla, cached
+from jesse.strategies import Strategy as Vanilla
 from jesse.helpers import is_live
-import requests
 from jesse import utils
 from importlib.metadata import version
 from pathlib import Path
 
+from . import cache, env
+from .brackets import TierTable, binance_store, bybit_store
+from .cache import candle_cached
+from .logs import DEBUG, INFO, WARNING, Logger, StrategySink, console_print, file_sink, flusher, stdout_sink
+from .control import control_files
+from .downloads import downloader
+from .journal import SessionJournal
+from .notify import dispatcher
+from .portfolio import Portfolio
+from .profiling import profiled, profiler
+from .recorder import MetricRecorder
+from . import replay, risk, sizing
+from .rules import is_expired, rules_index
+
 # if is_live:
 import pickle
 
@@ -41,7 +55,7 @@ class Strat(Vanilla):
 
     def __init__(self):
         super().__init__()
-        print(f"Standalone Strategy Template v. {version('strat')}")
+        console_print(f"Standalone Strategy Template v. {version('strat')}")
 
         ex_exchanges = ["Binance Futures", "Binance", "Bybit Perpetual"]
         exchange_codes = {
@@ -62,11 +76,14 @@ class Strat(Vanilla):
         self.notional = 6
         self.stepSize = 0.01
         self.pricePrecision = 6
+        self.tickSize = 0.000001
+        self.quantizer = None
 
         # Kill Switch and break even exit variables
         self.break_even_file = None
         self.pause_file = None
         self.pause_ap_file = None
+        self.control_files_interval = 1.0  # seconds, max. delay until a created/removed control file is seen.
 
         # Shared variables
         self.shared_vars["ts"] = 0
@@ -85,14 +102,21 @@ class Strat(Vanilla):
         self.shared_vars["max_total_value"] = 0
         self.shared_vars["run_once_multi_routes"] = True
         self.shared_vars["max_dd_sim"] = 0
+        self.shared_vars["portfolio"] = Portfolio()  # Fresh per run, routes publish into it from their first candle.
 
         self.max_position_value = 0
         self.active = False
         self.trade_ts = None
         self.first_run = True
+        self._timeframe_ms = None
+        self._ts_key = None
+        self._ts = None
+        self.session_journal = None
+        self.metric_recorder = None
 
         self.max_open_positions = 0
         self.current_cycle_positions = 0
+        self.reentry_plan = None
 
         self.insuff_margin_count = 0
         self.max_insuff_margin_count = 0
@@ -122,6 +146,16 @@ class Strat(Vanilla):
         self.last_trade_type = None  # 'udd_stop'
         self.log_enabled = False
         self.debug_enabled = True
+        self.log_file = None  # eg. "logs/strat.log", extra log file written in batches by a background thread.
+        self.log_file_level = DEBUG  # File sink level, independent of log_enabled/debug_enabled.
+        self.log_file_max_bytes = 10 * 1024 * 1024  # Rotated when bigger, 5 backups are kept.
+        self.log_buffered = False  # Backtests: batch console output instead of one write per line.
+        self.record_metrics = False  # Record risk metrics every candle, exported to metrics_dir as .npz at terminate.
+        self.metrics_dir = "metrics"
+        self.profile_enabled = False  # Time Strat's hot path methods, report is printed at terminate.
+        self.profile_file = None  # eg. "profile.json", machine readable profile for comparing runs.
+        self.strategy_sink = StrategySink(self)
+        self.logger = Logger(lambda: (self.ts, self.symbol), [self.strategy_sink])
         self.trade_with_bybit_rules = False
         self.margin_ratio_treshold = 97
         # enable_boosting replaced with trade_minimum variable
@@ -129,6 +163,10 @@ class Strat(Vanilla):
         self.keep_running_in_case_of_liquidation = False
         self.fixed_margin_ratio = None
         self.use_initial_balance = False
+        self.rules_ttl = 60 * 60  # seconds, live mode re-downloads exchange rules older than this.
+        self.intra_candle_worst_case = False  # Backtests: also check udd, margin ratio and liquidation at the candle's low (longs) / high (shorts).
+        self.metric_cache_enabled = True
+        self.metric_cache_debug = False  # Recompute cached risk metrics and report mismatches.
 
         try:
             from dotenv import load_dotenv
@@ -148,13 +186,22 @@ class Strat(Vanilla):
 
         self.binance_lev_brackets = None
         self.bybit_risk_limits = None
+        self.binance_tier_table = None
+        self.bybit_tier_table = None
+
+        self._metric_cache = {}
+        self._metric_cache_key = None
+
+        # Tier constants of the current position, see margin_band
+        self._alert_band = None
+        self.alert_band_guard = 0.002  # Re-check with the full margin ratio within 0.2% of a trigger price.
 
     def before(self) -> None:
         if self.first_run:
             self.run_once()
 
     def run_once(self):
-        print("--------> RUN ONCE!")
+        console_print("--------> RUN ONCE!")
         try:
             if self.is_open:
                 self.resume = True
@@ -172,7 +219,7 @@ class Strat(Vanilla):
         if self.symbol.endswith("-USD"):
             self._symbol = self.symbol.replace("-USD", "-PERP")
 
-        # If exchange rule files are not present or we're trading live, download them
+        # If exchange rule files are not present or expired while we're trading live, download them
         exc = "Bybit USDT Perpetual" if self.trade_with_bybit_rules else self.exchange
 
         # BinanceFuturesExchangeInfo.json
@@ -186,25 +233,38 @@ class Strat(Vanilla):
             or self.exchange == "Bybit USDT Perpetual"
             or self.trade_with_bybit_rules
         ):
-            if not os.path.exists(local_fn) or is_live():
+            if not os.path.exists(local_fn) or (
+                is_live() and is_expired(local_fn, self.rules_ttl)
+            ):
                 self.download_rules(exchange="Bybit USDT Perpetual")
             else:
-                print(f'Loading {self.exchange} rules from cached file: {local_fn}')
-            rules = self.bybit_rules()
+                console_print(f'Loading {self.exchange} rules from cached file: {local_fn}')
+            symbol_rules = self.bybit_rules()
         else:
             # Fall back to Binance Perp rules if exchange != bybit
-            if not os.path.exists(local_fn) or is_live():
+            if not os.path.exists(local_fn) or (
+                is_live() and is_expired(local_fn, self.rules_ttl)
+            ):
                 self.download_rules(exchange="Binance Futures", local_fn=local_fn)
-            rules = self.binance_rules(fn=local_fn)
-
-        self.minQty = float(rules["minQty"])
-        self.notional = float(rules["notional"])
-        self.stepSize = float(rules["stepSize"])
-        self.pricePrecision = int(rules["pricePrecision"])
-        self.quantityPrecision = int(rules["quantityPrecision"])  # Base asset precision
+            symbol_rules = self.binance_rules(fn=local_fn)
+
+        self.minQty = float(symbol_rules["minQty"])
+        self.notional = float(symbol_rules["notional"])
+        self.stepSize = float(symbol_rules["stepSize"])
+        self.pricePrecision = int(symbol_rules["pricePrecision"])
+        self.tickSize = float(symbol_rules["tickSize"])
+        self.quantityPrecision = int(symbol_rules["quantityPrecision"])  # Base asset precision
+        self.quantizer = sizing.Quantizer(
+            self.stepSize,
+            self.quantityPrecision,
+            self.pricePrecision,
+            self.minQty,
+            self.notional,
+            self.tickSize,
+        )
 
         self.console(
-            f"Rules set for {self.exchange}, Rules Hack: {self.trade_with_bybit_rules}, quantityPrecision:{self.quantityPrecision}, minQty:{self.minQty}, notional:{self.notional} stepSize:{self.stepSize} pricePrecision:{self.pricePrecision}"
+            f"Rules set for {self.exchange}, Rules Hack: {self.trade_with_bybit_rules}, quantityPrecision:{self.quantityPrecision}, minQty:{self.minQty}, notional:{self.notional} stepSize:{self.stepSize} pricePrecision:{self.pricePrecision} tickSize:{self.tickSize}"
         )
         self.console("Trading Mode.") if is_live() else self.console(
             "Not Trading Mode.", False
@@ -217,6 +277,14 @@ class Strat(Vanilla):
         self.pause_file = f"{self.symbol}.pause"
         self.pause_ap_file = f"{self.symbol}.pause_ap"
         self.kill_sw_file = "KILL.SWITCH"
+        control_files.interval = self.control_files_interval
+        if self.profile_enabled:
+            profiler.enable()
+
+        if self.log_file:
+            self.logger.add_sink(file_sink(self.log_file, self.log_file_level, self.log_file_max_bytes))
+        if self.log_buffered and not is_live():
+            self.strategy_sink.stream = stdout_sink()
 
         self.console(
             f"INFO: Break even file name: {self.break_even_file}, Pause at profit file name: {self.pause_ap_file}, Pause file name: {self.pause_file}, Killswitch file name: {self.kill_sw_file} ",
@@ -240,6 +308,8 @@ class Strat(Vanilla):
         self.shared_vars["max_margin_ratio_ts"] = None
         self.shared_vars["max_dd_sim"] = 0  # Simulated max. drawdown
 
+        # Only this run's routes count in TMM1/UPNL1 and the totals.
+        self.portfolio.retain(route.symbol for route in self.routes)
         self.update_shared_vars("runonce")
 
         self.min_pnl = 0
@@ -317,50 +387,81 @@ class Strat(Vanilla):
             return dd
         return 0
 
+    @property
+    def journal(self):
+        """Session journal of this route, see journal.SessionJournal"""
+        fname = self.session_file_name.replace(".pickle", ".journal")
+        if self.session_journal is None or self.session_journal.path.name != fname:
+            if self.session_journal is not None:
+                self.session_journal.close()
+            self.session_journal = SessionJournal(fname)
+        return self.session_journal
+
+    @profiled()
     def save_session_as_pickle(self):
-        self.console("Saving session as pickle...")
+        """Checkpoint current_state, only the changed fields are appended to the session journal."""
+        self.console("Saving session...")
         try:
-            with open(f"{self.session_file_name}", "wb") as f:
-                pickle.dump(self.current_state, f)
+            self.journal.append(self.current_state)
         except Exception as e:
             self.console("Failed to save session.")
             self.console(e)
 
+    @profiled()
     def load_session_from_pickle(self):
-        self.console("Loading session from pickle")
+        """Replay the session journal, older sessions saved as a single pickle are migrated."""
+        self.console("Loading session from journal")
         try:
-            with open(f"{self.session_file_name}", "rb") as f:
-                self.restore_state_vars(pickle.load(f))
+            state = self.journal.replay()
+            if state is None and os.path.exists(self.session_file_name):
+                with open(f"{self.session_file_name}", "rb") as f:
+                    state = pickle.load(f)
+                self.journal.append(state)
+            if state is None:
+                self.console(f"No saved session for {self.session_file_name}", force=True)
+                return
+            self.restore_state_vars(state)
         except Exception as e:
-            self.console(f"Error loading state from {self.session_file_name}")
+            self.console(f"Error loading state from {self.journal.path}: {e}", force=True)
 
+    @profiled()
     def update_shared_vars(self, caller=None):
+        if profiler.enabled:
+            profiler.tick(self.current_candle[0])
         self.save_min_pnl()
         # dd_sim = self.drawdown_simulated
         # print(f'Update shared vars. Caller: {caller}, {self.drawdown_simulated=}, {self.balance=},?{self.wallet_equivalent=}, {self.cycle_initial_balance=}, {self.position.value=}')
 
-        self.shared_vars[self.symbol] = {
-            "active": str(self.active),
-            "is_open": str(self.is_open),
-            "pos_value": round(self.position.value, 6) if self.is_open else 0,
-            "pnl": round(self.position.pnl, 6) if self.is_open else 0,
-            "pnl%": round(self.position.pnl_percentage, 6) if self.is_open else 0,
-            #  'InsufMargin': str(self.available_margin < self.cycle_pos_size * self.boost),
-            "max_open": self.max_open_positions,
-            "cycle_pos": round(self.current_cycle_positions, 2),
-            "maintenance_margin": round(self.maintenance_margin, 6),
-        }
+        # Route state is a slotted record updated in place, shared_vars[symbol] reads like the old dict.
+        state = self.portfolio.route(self.symbol)
+        if self.shared_vars.get(self.symbol) is not state:
+            self.shared_vars[self.symbol] = state
+
+        state.active = self.active
+        state.is_open = self.is_open
+        state.pos_value = self.position.value if state.is_open else 0.0
+        state.pnl = self.position.pnl if state.is_open else 0.0
+        state.pnl_perc = self.position.pnl_percentage if state.is_open else 0.0
+        #  'InsufMargin': str(self.available_margin < self.cycle_pos_size * self.boost),
+        state.max_open = self.max_open_positions
+        state.cycle_pos = self.current_cycle_positions
+        state.maintenance_margin = self.maintenance_margin
+
+        self.portfolio.publish(
+            self.symbol, state.maintenance_margin, state.pnl, state.pos_value
+        )
+        cache.bump_shared_revision()
         # We need to store maintenance margin per route to call from other routes. See above. (Needed for Liquidation Price Calculation)
 
         self.max_position_value = max(
-            self.max_position_value, self.shared_vars[self.symbol]["pos_value"]
+            self.max_position_value, round(state.pos_value, 6)
         )  # Indiviual position value
         self.shared_vars["ts"] = self.ts
         self.shared_vars["total_value"] = self.get_total_value
         self.shared_vars["unrealized_pnl"] = self.unreal_pnl
         self.shared_vars["margin_balance"] = self.margin_balance
         self.shared_vars["maint_margin"] = self.maintenance_margin
-        self.shared_vars["margin_ratio"] = self.margin_ratio(caller)
+        self.shared_vars["margin_ratio"] = self.margin_check(caller)
         self.shared_vars["min_margin"] = min(
             self.shared_vars["min_margin"], self.available_margin
         )
@@ -375,6 +476,56 @@ class Strat(Vanilla):
             self.drawdown_simulated, self.shared_vars["max_dd_sim"]
         )
 
+        if self.intra_candle_worst_case:
+            self.check_worst_case(caller)
+
+        if self.record_metrics:
+            self.record_candle_metrics(state)
+
+    def record_candle_metrics(self, state):
+        """Record this candle's risk metrics in the route's MetricRecorder (one row per candle, the last call wins), see recorder.py"""
+        if self.metric_recorder is None:
+            self.metric_recorder = MetricRecorder()
+
+        self.metric_recorder.append(
+            self.current_candle[0],
+            self.price_,
+            state.pos_value,
+            state.maintenance_margin,
+            self.shared_vars["margin_ratio"],
+            self.LP1,
+            self.shared_vars["lp_rate"],
+            self.udd,
+            self.available_margin,
+        )
+
+    def export_metrics(self):
+        """Save the recorded metrics as <metrics_dir>/<session name>.npz"""
+        if self.metric_recorder is None or not self.metric_recorder.size:
+            return None
+
+        fname = Path(self.metrics_dir) / self.session_file_name.replace(".pickle", ".npz")
+        return self.metric_recorder.export(
+            fname,
+            symbol=self.symbol,
+            exchange=self.exchange,
+            leverage=self.leverage,
+            timeframe=self.timeframe,
+        )
+
+    @property
+    def metric_cache_key(self):
+        """State the cached risk metrics depend on, see cache.candle_cached"""
+        return (
+            self.current_candle[0],
+            self.price_,
+            self.position.qty,
+            self.position.entry_price,
+            self.cap,
+            self.fixed_margin_ratio,
+            cache.shared_revision,
+        )
+
     @property
     def price_(self):
         """Return self.close if we backtest, self.price at live"""
@@ -390,60 +541,31 @@ class Strat(Vanilla):
             float: minimum allowed quantity in base asset
             float: minimum allowed position size in quote asset
         """
-        cycle_pos_size = 0
-        # If USD value of minQTY is greater than minimum notional, use minQTY.
-        # Convert minQTY to dollar size and add potential fees before converting back to qty.
-        if self.minQty * self.price_ >= self.notional:
+        qty, cycle_pos_size, fees, by_qty = sizing.min_order_size(
+            self.price_,
+            self.minQty,
+            self.notional,
+            self.stepSize,
+            self.quantityPrecision,
+            self.fee_rate,
+        )
+
+        if by_qty:
             self.console(
                 f"minQty * price_ > notional: {self.minQty * self.price_} > {self.notional}",
                 False,
             )
-            qty = self.minQty
-            cycle_pos_size = qty * self.price_
-            fees = cycle_pos_size * self.fee_rate * 6
-            cycle_pos_size += fees
-            cycle_pos_size *= 1.05
-            qty = utils.size_to_qty(
-                cycle_pos_size,
-                self.price_,
-                precision=self.quantityPrecision,
-                fee_rate=self.fee_rate,
-            )
             self.console(
                 f"⚖ Calculate minimum by Qty {self.price_=}, {qty=}, Cycle Pos. Size: {cycle_pos_size:0.2f}, {self.notional=}, {self.minQty=}, {self.stepSize=}, Fees: {fees:0.3f}",
                 False,
             )
-            return qty, cycle_pos_size
-
-        qty = utils.size_to_qty(
-            self.notional,
-            self.price_,
-            precision=self.quantityPrecision,
-            fee_rate=self.fee_rate,
-        )
-
-        while True:  # TODO: Remove infinite loop!
-            qty += self.stepSize
-            cycle_pos_size = qty * self.price_
-            cycle_pos_size += cycle_pos_size * (self.fee_rate * 3)
-
-            if cycle_pos_size > self.notional:
-                fees = cycle_pos_size * (self.fee_rate * 6)
-                cycle_pos_size += fees
-                cycle_pos_size *= 1.05
-
-                qty = utils.size_to_qty(
-                    cycle_pos_size,
-                    self.price_,
-                    precision=self.quantityPrecision,
-                    fee_rate=self.fee_rate,
-                )
+        else:
+            self.console(
+                f"Calculate minimum by Nominal {self.price_=}, {qty=}, Cycle Pos. Size: {cycle_pos_size:0.2f}, {self.notional=}, {self.minQty=}, {self.stepSize=}, Fees: {fees:0.3f}",
+                False,
+            )
 
-                self.console(
-                    f"Calculate minimum by Nominal {self.price_=}, {qty=}, Cycle Pos. Size: {cycle_pos_size:0.2f}, {self.notional=}, {self.minQty=}, {self.stepSize=}, Fees: {fees:0.3f}",
-                    False,
-                )
-                return qty, cycle_pos_size
+        return qty, cycle_pos_size
 
     @property
     def avgEntryPrice(self) -> float:
@@ -477,42 +599,32 @@ class Strat(Vanilla):
     # Bybit:
     # see https://help.bybit.com/hc/en-us/articles/900000181046-Liquidation-Price-USDT-Contract-
 
+    @property
+    def portfolio(self):
+        """Running totals of all routes' published metrics, shared through shared_vars."""
+        try:
+            return self.shared_vars["portfolio"]
+        except KeyError:
+            self.shared_vars["portfolio"] = Portfolio()
+            return self.shared_vars["portfolio"]
+
     @property
     def WB(self):
         """WB Wallet Balance"""
         return self.cap  # ital?
 
     @property
+    @candle_cached
     def TMM1(self):
         """TMM1 Total Maintenance Margin of all other contracts, excluding itself"""
-        tmm1 = 0
-        # Iterate over all routes and sum up all maintenance margin
-        for r in self.routes:
-            # If route is not self, add maintenance margin to tmm1
-            if r.symbol != self.symbol:
-                try:
-                    tmm1 += self.shared_vars[r.symbol][
-                        "maintenance_margin"
-                    ]  # ❗ Needs to be checked.
-                except:
-                    pass
-        return tmm1
+        # Total of all routes minus this route, see Portfolio
+        return self.portfolio.others("maintenance_margin", self.symbol)
 
     @property
+    @candle_cached
     def UPNL1(self):
         """UPNL1 Unrealized PNL of all other contracts, excluding itself"""
-        upnl1 = 0
-        # Iterate over all routes and sum up all unrealized pnl
-        for r in self.routes:
-            # If route is not self, add unrealized pnl to upnl1
-            if r.symbol != self.symbol:
-                try:
-                    # ❗ Needs to be checked.
-                    upnl1 += self.shared_vars[r.symbol]["pnl"]
-                except:
-                    pass
-
-        return upnl1
+        return self.portfolio.others("pnl", self.symbol)
 
     @property
     def cumB(self):
@@ -590,6 +702,8 @@ class Strat(Vanilla):
         return 0
 
     @property
+    @profiled("LP1")
+    @candle_cached
     def LP1(self):
         """LP1 Liquidation Price"""
         if not self.is_open:
@@ -616,22 +730,25 @@ class Strat(Vanilla):
     # TODO: @property
     def lp_rate(self) -> float:
         """Liquidation Price vs Mark Price rate"""
+        rate = self._lp_rate()
+        if self.is_open:
+            self.save_max_lp_ratio(rate)
+        return rate
+
+    @candle_cached
+    def _lp_rate(self) -> float:
         if not self.is_open:
             return float(
                 "nan"
             )  # self.LP1 / self.avgEntryPrice if self.avgEntryPrice > 0 else float('nan')
 
-        lp = self.LP1
-
-        rate = lp / self.price_ if self.is_long else self.price_ / lp
-        self.save_max_lp_ratio(rate)
-        return rate
+        return risk.lp_rate(self.LP1, self.price_, self.is_long)
 
     def print_lp(self):
         if self.LP1 > 0:
             rate = self.LP1 / self.price_ if self.is_long else self.price_ / self.LP1
-            msg = f"\n{self.ts} {self.symbol} LP1: {self.LP1:0.2f}, Price: {self.price_:0.2f}, Rate: {rate:0.2f} Balance: {self.cap:0.2f}, AvgEntry: {self.avgEntryPrice:0.2f}, Pos Size: {self.position.value:0.2f}, Pos Qty: {self.position.qty:0.2f}, Pnl%: {self.position.pnl_percentage / self.leverage:0.2f}%, AvailMargin: {self.available_margin:0.2f}, Actual Margin Ratio: {self.margin_ratio('update position')}"
-            print(f"\033[33m{msg}\033[0m")
+            msg = f"LP1: {self.LP1:0.2f}, Price: {self.price_:0.2f}, Rate: {rate:0.2f} Balance: {self.cap:0.2f}, AvgEntry: {self.avgEntryPrice:0.2f}, Pos Size: {self.position.value:0.2f}, Pos Qty: {self.position.qty:0.2f}, Pnl%: {self.position.pnl_percentage / self.leverage:0.2f}%, AvailMargin: {self.available_margin:0.2f}, Actual Margin Ratio: {self.margin_ratio('update position')}"
+            self.logger.emit(WARNING, msg, False, color=33)
 
     #
 
@@ -641,57 +758,38 @@ class Strat(Vanilla):
         """
         Calculate the total value of all open positions.
         """
+        tv = self._total_value()
+
+        self.shared_vars["max_total_value"] = max(
+            self.shared_vars["max_total_value"], tv
+        )
 
+        return round(tv, 6)
+
+    @candle_cached
+    def _total_value(self) -> float:
         tv = 0
 
         # If we trade single route use newest the position value.
         # Reading position value from shared vars may cause a delay. Need to be checked.
 
         if len(self.routes) > 1:
-            for r in self.routes:
-                try:
-                    tv += self.shared_vars[r.symbol]["pos_value"]
-                except Exception:
-                    # self.debug('Not ready yet! (get_total_value)')
-                    pass
+            tv = self.portfolio.total("pos_value")
         else:
             tv = self.position.value
 
-        self.shared_vars["max_total_value"] = max(
-            self.shared_vars["max_total_value"], tv
-        )
-
-        return round(tv, 6)
+        return tv
 
     @property
+    @candle_cached
     def unreal_pnl(self) -> float:
         """Calculate the unrealized profit/loss of all open positions"""
-        spnl = 0
-
-        for r in self.routes:
-            try:
-                spnl += self.shared_vars[r.symbol]["pnl"]
-                # print(f"\nOK! {self.shared_vars[r.symbol]}")
-            except:
-                pass
-                # self.debug('Not ready yet! (unrealized_pnl)')
-        return round(spnl, 6)
+        return round(self.portfolio.total("pnl"), 6)
 
     @property
     def initial_margin(self) -> float:
         """Calculate the initial margin of all open positions"""
-        im = 0
-
-        for r in self.routes:
-            try:
-                im += (
-                    self.shared_vars[r.symbol]["pos_value"] / self.leverage
-                )  # * self.fee_rate
-                # print(f"\nOK! {self.shared_vars[r.symbol]}")
-            except:
-                pass
-                # self.debug('Not ready yet! (initial_margin)')
-        return round(im, 6)
+        return round(self.portfolio.total("pos_value") / self.leverage, 6)
 
     @property
     def available_margin(self) -> float:
@@ -714,6 +812,7 @@ class Strat(Vanilla):
         return round(self.cap + self.unreal_pnl, 6)
 
     @property
+    @candle_cached
     def maintenance_margin(self):
         """
         Calculate the maintenance margin
@@ -732,10 +831,12 @@ class Strat(Vanilla):
                 - self.risk_limits()["maintAmount"]
             )  # Added maintenance amount to fixed margin calculation.
 
+        rl = None
         try:
+            rl = self.risk_limits()
             mm = (
-                self.position.value * self.risk_limits()["maintMarginRatio"]
-                - self.risk_limits()["maintAmount"]
+                self.position.value * rl["maintMarginRatio"]
+                - rl["maintAmount"]
             )
         except Exception:
             mm = self.position.value * 0.75
@@ -743,30 +844,180 @@ class Strat(Vanilla):
             # print("self.position.value", type(self.position.value))
             # print("self.risk_limits()['maintMarginRatio']", type(self.risk_limits()['maintMarginRatio']))
             # print("self.risk_limits()['maintAmount']", type(self.risk_limits()['maintAmount']))
-            if self.risk_limits() is None:
-                print("self.risk_limits() is None")
+            if rl is None:
+                console_print("self.risk_limits() is None")
 
         # self.position.value * self.risk_limits()['maintMarginRatio']  #  - self.risk_limits()['maintAmount']
         return mm
 
+    @profiled()
     def margin_ratio(self, caller=None):
         """Calculate the margin ratio"""
-        mr = round((self.maintenance_margin / self.margin_balance) * 100, 2)
-        # We have MRs greater than 100% if we let it keep running.
-        mr = abs(mr) + 100 if mr < 0 else mr
+        mr = self._margin_ratio()
         self.save_max_mr(mr, caller)
         self.check_liquidation(mr, caller)
         return mr
 
+    @candle_cached
+    def _margin_ratio(self):
+        mr = round((self.maintenance_margin / self.margin_balance) * 100, 2)
+        # We have MRs greater than 100% if we let it keep running.
+        return abs(mr) + 100 if mr < 0 else mr
+
+    @property
+    @candle_cached
+    def worst_case(self):
+        """
+        udd, margin ratio and LP rate at the candle's adverse extreme, low for longs and high for shorts,
+        in one risk.risk_point call. None while flat or live (live prices already include the wicks).
+        Other routes are taken at their close, their extremes don't have to be at the same moment.
+        """
+        if not self.is_open or self.is_trading:
+            return None
+
+        price = self.low if self.is_long else self.high
+        s = risk.risk_point(
+            self.tier_table,
+            price,
+            self.position.qty,
+            self.avgEntryPrice,
+            self.WB,
+            self.TMM1,
+            self.UPNL1,
+            self.fixed_margin_ratio,
+        )
+
+        pnl = s["pnl"]
+        lp1 = s["LP1"]
+        return {
+            "price": price,
+            "pnl": pnl,
+            "pnl_perc": pnl / (abs(self.position.qty) * self.avgEntryPrice) * 100 * self.leverage,
+            "pos_value": s["position_value"],
+            "udd": pnl * 100 / (self.balance + pnl) if pnl < 0 else 0,
+            "margin_ratio": s["margin_ratio"],
+            "LP1": lp1,
+            "lp_rate": risk.lp_rate(lp1, price, self.is_long),
+        }
+
+    @profiled()
+    def check_worst_case(self, caller=None):
+        """
+        Intra candle version of save_min_pnl, lp_rate and margin_ratio's checks, see worst_case.
+        Updates the same running maxima and liquidates at the threshold like a close would.
+        """
+        wc = self.worst_case
+        if wc is None:
+            return None
+
+        if wc["udd"] < self.dd["min_pnl_ratio"]:
+            self.dd["min_pnl_ratio"] = wc["udd"]
+            self.dd["pnl"] = wc["pnl"]
+            self.dd["pnl_perc"] = wc["pnl_perc"]
+            self.dd["lpr"] = wc["lp_rate"]
+            self.dd["mr_ratio"] = wc["margin_ratio"]
+            self.dd["balance"] = self.balance
+            self.dd["pos_size"] = wc["pos_value"]
+            self.dd["ts"] = self.ts
+
+        caller = f"{caller} (worst case {wc['price']})"
+        self.save_max_lp_ratio(wc["lp_rate"], caller)
+        self.save_max_mr(wc["margin_ratio"], caller)
+        self.check_liquidation(wc["margin_ratio"], caller)
+        return wc
+
     def check_mr_alert(self, mr, caller=None):
         """For multi route strategies use a shared var to alert the other routes."""
         if mr >= self.margin_ratio_treshold:
             self.shared_vars["margin_alert"] = "True"
-            msg = f"Margin Ratio Alert!: {mr}%, Avail. margin: {round(self.available_margin, 2)}, Balance: {round(self.cap, 2)} * {self.leverage} = {round(self.cap * self.leverage, 2)}, Prev. Margin Ratio: {self.shared_vars['margin_ratio']}%, Total value: {self.shared_vars['total_value']}, Margin balance: {self.shared_vars['margin_balance']}, Maint Margin: {self.shared_vars['maint_margin']}, {self.div=}, {self.profit_ratio2=}, {(int(self.profit_ratio2 + 1) * self.div)=}\n{json.dumps(self.shared_vars, indent=4)}\nCaller: {caller}"
-            self.console(msg, False)
+            msg = lambda: f"Margin Ratio Alert!: {mr}%, Avail. margin: {round(self.available_margin, 2)}, Balance: {round(self.cap, 2)} * {self.leverage} = {round(self.cap * self.leverage, 2)}, Prev. Margin Ratio: {self.shared_vars['margin_ratio']}%, Total value: {self.shared_vars['total_value']}, Margin balance: {self.shared_vars['margin_balance']}, Maint Margin: {self.shared_vars['maint_margin']}, {self.div=}, {self.profit_ratio2=}, {(int(self.profit_ratio2 + 1) * self.div)=}\n{json.dumps(self.shared_vars, indent=4, default=dict)}\nCaller: {caller}"
+            self.console(msg, False, mr=mr, caller=caller)
         else:
             self.shared_vars["margin_alert"] = "False"
 
+    @property
+    def margin_band(self):
+        """
+        Tier constants of the current position for margin_check:
+        price range of the tier, maintenance margin rate and amount, c = WB - qty * entry.
+        Rebuilt after a fill, a balance change, a settings change or when the price leaves the tier.
+        Other routes' pnl is not part of it, margin_check adds it as a shift.
+        """
+        qty = self.position.qty
+        size = abs(qty)
+        entry = self.avgEntryPrice if self.is_open else 0.0
+        key = (qty, entry, self.WB, self.fixed_margin_ratio)
+        price = self.price_
+
+        band = self._alert_band
+        if band is not None and band["key"] == key and band["lo"] <= price < band["hi"]:
+            return band
+
+        rl = self.risk_limits()
+        table = self.tier_table
+        i = table.index(self.position.value)
+        if size:
+            lo = table.floors[i] / size if i < len(table) else table.caps[-1] / size
+            hi = table.caps[i] / size if i < len(table) else float("inf")
+        else:
+            lo, hi = float("-inf"), float("inf")
+
+        fixed = isinstance(self.fixed_margin_ratio, (float, int))
+        self._alert_band = {
+            "key": key,
+            "lo": lo,
+            "hi": hi,
+            "qty": qty,
+            "size": size,
+            "mmr": self.fixed_margin_ratio if fixed else rl["maintMarginRatio"],
+            "cum": rl["maintAmount"],
+            "c": self.WB - qty * entry,
+        }
+        return self._alert_band
+
+    def margin_check(self, caller=None):
+        """
+        Per candle margin ratio with the max margin ratio and liquidation checks of margin_ratio.
+        Inside a tier the margin ratio is a closed form of the price: (size * price * mmr - cum) / (qty * price + c + UPNL1),
+        evaluated from margin_band instead of the full margin_ratio. Other routes' pnl shifts the threshold
+        and zero margin balance prices. The full margin_ratio runs when the threshold is reached
+        or the price is within alert_band_guard of a shifted trigger price.
+        margin_alert is left to check_mr_alert.
+        """
+        band = self.margin_band
+        price = self.price_
+        qty, size, mmr, cum = band["qty"], band["size"], band["mmr"], band["cum"]
+        c = band["c"] + self.UPNL1
+        t = self.margin_ratio_treshold / 100
+        guard = self.alert_band_guard
+
+        near = False
+        if qty:
+            zero_balance = -c / qty
+            near = zero_balance > 0 and abs(price - zero_balance) <= zero_balance * guard
+            denom = size * mmr - t * qty
+            if denom and not near:
+                trigger = (cum + t * c) / denom
+                near = trigger > 0 and abs(price - trigger) <= trigger * guard
+
+        margin_balance = qty * price + c
+        if not near and margin_balance:
+            mr = round((size * price * mmr - cum) / margin_balance * 100, 2)
+            mr = abs(mr) + 100 if mr < 0 else mr
+            if mr < self.margin_ratio_treshold:
+                self.save_max_mr(mr, caller)
+                self.check_liquidation(mr, caller)
+                return mr
+
+        return self.margin_ratio(caller)
+
+    def margin_threshold_reached(self, caller=None):
+        """Per candle margin ratio threshold check, see margin_check. Raising margin_alert is up to check_mr_alert."""
+        if not self.is_open:
+            return False
+        mr = self.margin_check(caller)
+        return mr < 0 or mr >= self.margin_ratio_treshold
+
     def check_global_margin_alert(self, caller=None):
         if (
             self.shared_vars["margin_alert"] == "False"
@@ -775,7 +1026,7 @@ class Strat(Vanilla):
             return False
 
         msg = f"🚨 Margin Ratio is at limits! {self.shared_vars['margin_ratio']:0.2f} ({caller})"
-        print(msg)
+        console_print(msg)
         # self.debug(msg)
         # self.console(msg)
         return True
@@ -787,20 +1038,19 @@ class Strat(Vanilla):
 
         if self.shared_vars["max_margin_ratio"] != max_mr_snapshot:
             self.shared_vars["max_margin_ratio_ts"] = self.ts
-            msg = f"Margin Ratio {max_mr_snapshot} -> {self.shared_vars['max_margin_ratio']} Caller: {caller}"
-            self.console(msg, False)
+            msg = lambda: f"Margin Ratio {max_mr_snapshot} -> {self.shared_vars['max_margin_ratio']} Caller: {caller}"
+            self.console(msg, False, mr=mr, caller=caller)
             # self.console(msg)
 
     def save_max_lp_ratio(self, lp_ratio, caller=None):
         """Save the max LP1/price ratio with timestamp"""
+        if math.isnan(lp_ratio):
+            return
         max_lp_snapshot = self.shared_vars["max_lp_ratio"]
         self.shared_vars["max_lp_ratio"] = max(lp_ratio, max_lp_snapshot)
 
         if self.shared_vars["max_lp_ratio"] != max_lp_snapshot:
             self.shared_vars["max_lp_ratio_ts"] = self.ts
-            msg = f"LP Ratio {max_lp_snapshot:0.2f} -> {self.shared_vars['max_lp_ratio']:0.2f}, Price: {self.price_}, Liq. Price: {self.LP1:0.2f}, Caller: {caller}"
-            # self.console(msg, False)
-            # self.console(msg)
 
     def check_liquidation(self, mr, caller=None):
         # sourcery skip: raise-specific-error
@@ -808,13 +1058,13 @@ class Strat(Vanilla):
         Check if the margin balance is below the maintenance margin and throw an exception if it is.
         """
         if mr < 0 or mr >= self.margin_ratio_treshold:
-            msg = (
+            msg = lambda: (
                 f"Got liqed? Margin Ratio: {mr}%, Avail. margin: {self.available_margin:0.2f}, "
                 f"Balance: {self.cap:0.2f} * {self.leverage} = {self.cap * self.leverage:0.2f}, "
                 f"Prev. Margin Ratio: {self.shared_vars['margin_ratio']}%, Total value: {self.shared_vars['total_value']}, "
                 f"Margin balance: {self.shared_vars['margin_balance']:0.2f}, Maint Margin: {self.shared_vars['maint_margin']:0.2f}, "
                 f"{self.div=}, {self.profit_ratio2=:0.2f}, {(int(self.profit_ratio2 + 1) * self.div)=:0.2f}, "
-                f"\n{json.dumps(self.shared_vars, indent=4)}\nCaller: {caller}"
+                f"\n{json.dumps(self.shared_vars, indent=4, default=dict)}\nCaller: {caller}"
             )
 
             if is_live():
@@ -826,67 +1076,31 @@ class Strat(Vanilla):
                 # Disabled for going live, any potential bug with this can cause a loss of funds
                 if not self.keep_running_in_case_of_liquidation:
                     # exit()
+                    msg = msg()
                     self.terminate()
                     raise Exception(msg)
 
-    def load_bybit_risk_limits(self):
-        from pathlib import Path
-
-        risk_limit_url = f"https://api.bybit.com/public/linear/risk-limit?symbol={self._symbol.replace('-', '')}"
-
-        if not Path("bybit").exists():
-            Path("bybit").mkdir()
-
-        fname = f"bybit/risk-limit-{self.symbol}.json"
-
-        print(f"\nLoading risk limits from {fname}")
-
-        try:
-            with open(fname) as f:
-                data = json.load(f)
-                self.bybit_risk_limits = data["result"]
-        except Exception as e:
-            print(os.listdir())
-            print(f"Can not load Bybit risk limit for {self.symbol} from: {fname}")
-            print("Will download from Bybit API")
-
-            try:
-                data = requests.get(risk_limit_url).json()
-                if "ret_msg" in data and data["ret_msg"] == "OK":
-                    self.bybit_risk_limits = data["result"]
-                    print(f"Risk limits for {self.symbol} loaded from Bybit API")
-                    # print(self.bybit_risk_limits)
-
-                    try:
-                        with open(fname, "w") as f:
-                            json.dump(data, f, indent=4)
-                        print(
-                            f"'Bybit Perpetual' risk limits for {self.symbol} saved to '{fname}'."
-                        )
-                    except:
-                        print(f"Failed to save {fname}")
-            except:
-                print(f"Failed to download {risk_limit_url}")
-                exit()
-
-    def load_binance_tier_brackets(self):
-        from pathlib import Path
-
-        fname = Path(__file__).parent / "Binance_lev_brackets.json"
-        print("\nLoading Binance tier brackets from:", fname)
+    @profiled()
+    def load_bybit_risk_limits(self, force_reload=False):
+        """Pick this symbol's risk limits from the consolidated store, see brackets.bybit_store"""
+        self.bybit_risk_limits = bybit_store.get(
+            self._symbol.replace("-", ""),
+            legacy_fname=f"bybit/risk-limit-{self.symbol}.json",
+            force_reload=force_reload,
+        )
 
-        try:
-            with open(fname) as f:
-                data = json.load(f)
-        except Exception as e:
-            print(os.listdir())
-            print(f"Error loading Binance tier brackets from: {fname}")
+        if not self.bybit_risk_limits:
+            console_print(f"Can not load Bybit risk limits for {self.symbol}")
+            exit()
 
-        for i in data:
-            if i["symbol"] == self._symbol.replace("-", ""):
-                self.binance_lev_brackets = i["brackets"]
-                break
+    @profiled()
+    def load_binance_tier_brackets(self, force_reload=False):
+        """Pick this symbol's brackets from the process-wide store, see brackets.binance_store"""
+        self.binance_lev_brackets = binance_store.get(
+            self._symbol.replace("-", ""), force_reload
+        )
 
+    @profiled()
     def risk_limits(self, psize: float = None, force_reload: bool = False):
         """
         Pick the correct risk limits based on the exchange.
@@ -903,57 +1117,125 @@ class Strat(Vanilla):
         elif "bybit" in self.exchange.lower():
             return self.bybit_limits(psize, force_reload)
         else:
-            print(
+            console_print(
                 f"Unknown exchange: {self.exchange}, loading Binance limits as default"
             )
             return self.binance_limits(psize, force_reload)
 
+    @property
+    def uses_bybit_limits(self):
+        """True if risk_limits() picks Bybit tiers for this route."""
+        exchange = self.exchange.lower()
+        return self.trade_with_bybit_rules or ("bybit" in exchange and "binance" not in exchange)
+
+    @property
+    def tier_table(self):
+        """The compiled TierTable risk_limits() uses for this route."""
+        self.risk_limits()
+        return self.bybit_tier_table if self.uses_bybit_limits else self.binance_tier_table
+
+    def risk_surface(self, prices, qty=None, entry_prices=None, wallet_balances=None):
+        """
+        LP1, maintenance margin and margin ratio for arrays of scenarios in one call, see risk.risk_surface.
+        Missing arguments default to the current position and balance.
+        Other routes' maintenance margin and pnl are taken as they are now.
+        """
+        if qty is None:
+            qty = self.position.qty
+        if entry_prices is None:
+            entry_prices = self.avgEntryPrice if self.is_open else 0.0
+        if wallet_balances is None:
+            wallet_balances = self.WB
+
+        return risk.risk_surface(
+            self.tier_table,
+            prices,
+            qty,
+            entry_prices,
+            wallet_balances,
+            tmm1=self.TMM1,
+            upnl1=self.UPNL1,
+            fixed_margin_ratio=self.fixed_margin_ratio,
+        )
+
+    def risk_replay(
+        self,
+        candles=None,
+        fills=None,
+        fixed_margin_ratio="current",
+        leverage=None,
+        size_scale=1.0,
+        price_column=replay.CLOSE,
+    ):
+        """
+        Per candle risk metrics of the run rebuilt from its candles and trades, see replay.replay.
+        The position still open at the end is included (see replay_fills) and the wallet balance
+        is on the strategy's basis: it ends at the live cap, or stays at it with use_initial_balance.
+        Other settings can be re-evaluated without running the strategy again:
+        fixed_margin_ratio (None disables it), leverage and size_scale.
+        price_column=replay.ADVERSE evaluates the candles' lows for longs and highs for shorts.
+        Single route view, other routes' margin and pnl are not included (see replay.replay_routes).
+        """
+        if fixed_margin_ratio == "current":
+            fixed_margin_ratio = self.fixed_margin_ratio
+        if fills is None:
+            fills = self.replay_fills()
+
+        balance = self.cap
+        if not self.use_initial_balance:
+            balance = replay.starting_balance(fills, balance, self.fee_rate)
+
+        self.risk_limits()
+        table = risk.tier_table(
+            self._symbol,
+            fixed_margin_ratio,
+            self.bybit_risk_limits if self.uses_bybit_limits else None,
+        )
+
+        return replay.replay(
+            table,
+            self.candles if candles is None else candles,
+            fills,
+            balance,
+            leverage=self.leverage if leverage is None else leverage,
+            fixed_margin_ratio=fixed_margin_ratio,
+            fee_rate=self.fee_rate,
+            size_scale=size_scale,
+            price_column=price_column,
+            compound=not self.use_initial_balance,
+        )
+
+    def replay_fills(self):
+        """Fills of the completed trades and of the position still open, see replay.open_position_fills."""
+        fills = replay.fills_from_trades(self.trades)
+        if self.is_open:
+            opened_at = getattr(self.position, "opened_at", None) or self.current_candle[0]
+            fills += replay.open_position_fills(
+                fills, self.orders, self.position.qty, self.avgEntryPrice, opened_at
+            )
+        return fills
+
     def binance_limits(self, psize=None, force_reload=False):
         """psize is the custom position size to calculate next limits.
         eg. calculate the max allowed leverage or position size before increasing the order size."""
 
-        r = {
-            "bracket": 0,
-            "initialLeverage": 0,
-            "notionalCap": 0,
-            "notionalFloor": 0,
-            "maintMarginRatio": 0.0,
-            "maint_amount": 0.0,
-        }
-
         # if psize is None, then use the current position size.
         if not psize:
             psize = self.position.value
 
         if not self.binance_lev_brackets or force_reload:
-            self.load_binance_tier_brackets()
-
-        for b in self.binance_lev_brackets:
-            if psize < b["notionalCap"]:
-                r["bracket"] = b["bracket"]
-                r["initialLeverage"] = b["initialLeverage"]
-                r["notionalCap"] = b["notionalCap"]
-                r["notionalFloor"] = b["notionalFloor"]
-
-                if isinstance(self.fixed_margin_ratio, (float, int)):
-                    r["maintMarginRatio"] = self.fixed_margin_ratio
-                else:
-                    r["maintMarginRatio"] = b["maintMarginRatio"]
-
-                r["maintAmount"] = b["cum"]
-                return r
-
-        r[
-            "maintMarginRatio"
-        ] = 0.75  # TODO: Bybit jsons are missing the last tiers' maintenance margin! Calculate next tiers.
-        r["maintAmount"] = 0
-        # print(self.bybit_risk_limits)
-        # print(psize)
-        # raise Exception(f"Failed to find risk limits for {self.symbol}")
-        # TODO: Bybit jsons are missing the last tiers' maintenance margin! Calculate next tiers.
-        return r
-        # raise Exception(f"Failed to find risk limits for {self.symbol} {psize=}")
-        # return None
+            self.load_binance_tier_brackets(force_reload)
+            self.binance_tier_table = None
+
+        if (
+            self.binance_tier_table is None
+            or self.binance_tier_table.fixed_margin_ratio != self.fixed_margin_ratio
+        ):
+            self.binance_tier_table = TierTable.from_binance(
+                self.binance_lev_brackets, self.fixed_margin_ratio
+            )
+
+        return self.binance_tier_table.lookup(psize)
 
     def bybit_limits(self, psize=None, force_reload=False):
         """
@@ -966,64 +1248,30 @@ class Strat(Vanilla):
         # New Initial Margin (IM) % =     IM Base rate + (Number of incremental * IM incremental rate)    eg. 1% + (1*0.75%)= 1.75%
         # New Maintenance Margin Amount = New MM%* Total Position Value                                   eg. 1% * 3,200,000 = 32,000 USDT
 
-        r = {
-            "bracket": 0,
-            "initialLeverage": 0,
-            "notionalCap": 0,
-            "notionalFloor": 0,
-            "maintMarginRatio": 0.0,
-            "maint_amount": 0.0,
-        }
-
         # if psize is None, then use the current position size.
         if psize is None:
             psize = self.position.value
 
         if not self.bybit_risk_limits or force_reload:
-            self.load_bybit_risk_limits()
-
-        for b in self.bybit_risk_limits:
-            if b["is_lowest_risk"] == 1:
-                rl_base_value = b["limit"]
-                mm_base_rate = b["maintain_margin"]
-                im_base_rate = b["starting_margin"]
-                break
-
-        for b in self.bybit_risk_limits:
-            if psize < b["limit"]:
-                r["bracket"] = b["id"]
-                r["initialLeverage"] = b["max_leverage"]
-                r["notionalCap"] = b["limit"]
-                # TODO: Do we really need it? There should be a difference between notionalFloor and previous tier's notionalCap.
-                r["notionalFloor"] = (
-                    b["limit"] - rl_base_value
-                )  # rl_base_value * (int(b['id']) - 1) IDs are not 1 indexed
-
-                if isinstance(self.fixed_margin_ratio, (float, int)):
-                    r["maintMarginRatio"] = self.fixed_margin_ratio
-                else:
-                    r["maintMarginRatio"] = b["maintain_margin"]
-
-                # TODO: Calculate for Bybit if available/needed
-                r["maintAmount"] = 0.0
-                return r
-
-        r[
-            "maintMarginRatio"
-        ] = 0.10  # TODO: Bybit jsons are missing the last tiers' maintenance margin! Calculate next tiers.
-        r["maintAmount"] = 0
-        # print(self.bybit_risk_limits)
-        # print(psize)
-        # raise Exception(f"Failed to find risk limits for {self.symbol}")
-        # TODO: Bybit jsons are missing the last tiers' maintenance margin! Calculate next tiers.
-        return r
+            self.load_bybit_risk_limits(force_reload)
+            self.bybit_tier_table = None
+
+        if (
+            self.bybit_tier_table is None
+            or self.bybit_tier_table.fixed_margin_ratio != self.fixed_margin_ratio
+        ):
+            self.bybit_tier_table = TierTable.from_bybit(
+                self.bybit_risk_limits, self.fixed_margin_ratio
+            )
+
+        return self.bybit_tier_table.lookup(psize)
 
     def check_negative_margin(self):
         if self.available_margin >= 0:
             return False
         # self.dump_routes_info()
         self.debug(
-            f"🦆 Negative Margin: {self.available_margin:0.2f}, Balance: {self.cap:0.2f} * {self.leverage} = {self.cap * self.leverage:0.2f}, Margin Ratio: {self.shared_vars['margin_ratio']}%, Total value: {self.shared_vars['total_value']}, Margin balance: {self.shared_vars['margin_balance']}, Maint Margin: {self.shared_vars['maint_margin']} - {self.shared_vars[self.symbol]}, {self.div=}, {self.profit_ratio2=} {(int(self.profit_ratio2 + 1) * self.div)=}"
+            lambda: f"🦆 Negative Margin: {self.available_margin:0.2f}, Balance: {self.cap:0.2f} * {self.leverage} = {self.cap * self.leverage:0.2f}, Margin Ratio: {self.shared_vars['margin_ratio']}%, Total value: {self.shared_vars['total_value']}, Margin balance: {self.shared_vars['margin_balance']}, Maint Margin: {self.shared_vars['maint_margin']} - {self.shared_vars[self.symbol]}, {self.div=}, {self.profit_ratio2=} {(int(self.profit_ratio2 + 1) * self.div)=}"
         )
         return True
 
@@ -1054,41 +1302,45 @@ class Strat(Vanilla):
 
         if self.check_killswitch():
             if not self.is_trading:
-                print("ks.", end="")
+                self.logger.emit(WARNING, "ks.", raw=True, end="")
             else:
                 self.console(f"{self.kill_sw_file=} file still exits. Caller: {caller}")
             return True
 
         return False
 
+    @profiled()
     def check_breakeven(self):
         try:
-            return self.break_even_file in os.listdir()
+            return control_files.exists(self.break_even_file)
         except:
             self.console(
                 f"Exception in checking break even file. {self.break_even_file=}"
             )
             return False
 
+    @profiled()
     def check_killswitch(self):
         try:
-            return self.kill_sw_file in os.listdir()
+            return control_files.exists(self.kill_sw_file)
         except:
             self.console(f"Exception in checking {self.kill_sw_file=} file.")
             return False
 
+    @profiled()
     def check_pause(self):
         try:
-            return self.pause_file in os.listdir()
+            return control_files.exists(self.pause_file)
         except:
             self.console(
                 f"Exception in checking pause file. {self.pause_file}", force=True
             )
             return False
 
+    @profiled()
     def check_pause_ap(self):
         try:
-            return self.pause_ap_file in os.listdir()
+            return control_files.exists(self.pause_ap_file)
         except:
             self.console(
                 f"Exception in checking pause at profit file. {self.pause_ap_file}",
@@ -1101,7 +1353,7 @@ class Strat(Vanilla):
             self.leverage
             > self.risk_limits(psize=0, force_reload=False)["initialLeverage"]
         ):
-            print(
+            console_print(
                 f"\nThe maximum allowed leverage for {self.symbol} at {self.exchange} is {self.risk_limits()['initialLeverage']}x, you have {self.leverage}x"
             )
             return False
@@ -1111,7 +1363,7 @@ class Strat(Vanilla):
         rls = self.risk_limits(psize, force_reload=False)
 
         if self.leverage > rls["initialLeverage"]:
-            print(
+            console_print(
                 f"\n{self.exchange} {self.symbol} Exchange rule violation. The maximum allowed leverage for your max. position size ({psize:0.1f}) is {rls['initialLeverage']}x. You had {self.leverage}x leverage set."
             )
             return False
@@ -1124,10 +1376,69 @@ class Strat(Vanilla):
         rls = self.risk_limits(psize, force_reload=False)
 
         if self.leverage > rls["initialLeverage"]:
-            print(
+            console_print(
                 f"\n{self.ts}{self.symbol} {self.exchange} The maximum allowed leverage for your next position size ({psize:0.2f}) is {rls['initialLeverage']}x, and you have {self.leverage}x leverage set., Caller: {caller}"
             )
 
+    def plan_reentry_ladder(self, sizes, deviations, base_price=None, side=None):
+        """
+        Plan the re-entry ladder of a cycle once, see risk.plan_ladder.
+        sizes are the order sizes (quote currency) and deviations the price deviations
+        from base_price (default: current price) for each step.
+        The current position, if any, is taken as the starting point.
+        Infeasible ladders are rejected (self.reentry_plan = None) before the first order.
+        """
+        if base_price is None:
+            base_price = self.price_
+        if side is None:
+            side = self.Side1BOTH if self.is_open else 1
+
+        plan = risk.plan_ladder(
+            self.tier_table,
+            base_price,
+            sizes,
+            deviations,
+            side,
+            self.WB,
+            self.leverage,
+            qty0=self.position.qty if self.is_open else 0.0,
+            entry0=self.avgEntryPrice if self.is_open else 0.0,
+            tmm1=self.TMM1,
+            upnl1=self.UPNL1,
+            threshold=self.margin_ratio_treshold,
+            fixed_margin_ratio=self.fixed_margin_ratio,
+            quantizer=self.quantizer,
+        )
+
+        if plan["ok"]:
+            self.reentry_plan = plan
+        else:
+            step = int(plan["step"][~plan["feasible"]][0])
+            console_print(
+                f"\n{self.ts} {self.symbol} Re-entry ladder rejected at step {step}: "
+                f"Price: {plan['price'][step]:0.4f}, Position value: {plan['position_value'][step]:0.2f}, "
+                f"Max. leverage: {plan['max_leverage'][step]:0.0f}x (have {self.leverage}x), "
+                f"Margin Ratio: {plan['margin_ratio'][step]:0.2f}%, LP1: {plan['LP1'][step]:0.4f}, "
+                f"Avail. margin: {plan['avail_margin'][step]:0.2f}"
+            )
+            self.reentry_plan = None
+
+        return plan
+
+    def reentry_step(self, step=None):
+        """Planned values of a ladder step (default: the next one by current_cycle_positions) or None."""
+        plan = self.reentry_plan
+        if plan is None:
+            return None
+
+        if step is None:
+            step = self.current_cycle_positions
+        if not 0 <= step < len(plan["step"]):
+            return None
+
+        return {k: v[step] for k, v in plan.items() if k != "ok"}
+
+    @profiled()
     def download_rules(self, exchange: str, local_fn: str = None):
         """Download the trading rules from the exchanges."""
 
@@ -1135,40 +1446,56 @@ class Strat(Vanilla):
 
         if not local_fn:
             # local_fn = f"{exc.replace(' ', '')}ExchangeInfo.json"
-            print('Creating new local fn cause local_fn not given')
+            console_print('Creating new local fn cause local_fn not given')
             local_fn = f"{exc.replace(' ', '')}ExchangeInfo.json".replace("BinanceExch", "BinanceFuturesExch")
         # else:
         #     print('local_fn parameter: ', local_fn)
 
-        print(
+        console_print(
             f"Downloading rules for {exchange}. {local_fn=}, URL: {self.trade_rule_urls[exc]}"
         )
-        # try:
-        data = requests.get(self.trade_rule_urls[exc]).json()
 
-        if "serverTime" not in data.keys():
-            print("if 'serverTime' not in data.keys():")
-            data["serverTime"] = datetime.datetime.now().timestamp() * 1000
+        def save(data):
+            if "serverTime" not in data.keys():
+                console_print("if 'serverTime' not in data.keys():")
+                data["serverTime"] = datetime.datetime.now().timestamp() * 1000
+
+            # Bybit api does not return server time so we need to add it manually using our server time
+            if "ret_msg" in data and data["ret_msg"] == "OK":
+                data["serverTime"] = datetime.datetime.now().timestamp() * 1000
+                console_print("Added local timestamp to Bybit data")
 
-        # Bybit api does not return server time so we need to add it manually using our server time
-        if "ret_msg" in data and data["ret_msg"] == "OK":
-            data["serverTime"] = datetime.datetime.now().timestamp() * 1000
-            print("Added local timestamp to Bybit data")
+            if not int(data["serverTime"]):
+                return False
 
-        if int(data["serverTime"]):
             try:
                 with open(local_fn, "w") as f:
                     json.dump(data, f, indent=4)
-                print(
+                console_print(
                     f"'{exc}' exchange info saved to '{local_fn}'. Server ts: {datetime.datetime.utcfromtimestamp(data['serverTime']/1000)}"
                 )
+                return True
             except Exception as e:
-                print(f"Failed to save {local_fn}")
-                print(e)
+                console_print(f"Failed to save {local_fn}")
+                console_print(e)
+                return False
+
+        # try:
+        data = downloader.get_json_if_modified(self.trade_rule_urls[exc], local_fn, save)
+
+        if data is None:
+            console_print(f"'{exc}' exchange info not modified, keeping '{local_fn}'.")
+            return
 
         # except Exception as e:
         #     print(f"Error while fetching data from {exc}. {e}")
 
+    def prefetch_rules(self, exchanges=("Binance Futures", "Bybit USDT Perpetual")):
+        """Download the rules of several exchanges in parallel."""
+        return downloader.run_many(
+            [lambda exchange=exchange: self.download_rules(exchange) for exchange in exchanges]
+        )
+
     def binance_rules(self, fn):
         """
         Parse Binance Futures trading rules.
@@ -1179,29 +1506,27 @@ class Strat(Vanilla):
             "minQty": 1,
             "notional": 0.0001,
             "stepSize": 0.1,
+            "tickSize": 0.000001,
         }
 
         try:
-            with open(fn) as f:
-                data = json.load(f)
-
-            for i in data["symbols"]:
-                if (
-                    i["symbol"] == self._symbol.replace("-", "")
-                    or self._symbol.replace("-", "") in i["symbol"]
-                ):
-                    rules_json = i
-                    break
+            rules_json = rules_index(fn).find(self._symbol.replace("-", ""))
+            filters = rules_json["filters"]
 
             rules["pricePrecision"] = int(rules_json["pricePrecision"])
-            rules["minQty"] = float(rules_json["filters"][1]["minQty"])
-            rules["stepSize"] = float(rules_json["filters"][2]["stepSize"])
-            rules["notional"] = float(rules_json["filters"][5]["notional"])
+            rules["minQty"] = float(filters["LOT_SIZE"]["minQty"])
+            rules["stepSize"] = float(
+                filters.get("MARKET_LOT_SIZE", filters["LOT_SIZE"])["stepSize"]
+            )
+            rules["notional"] = float(filters["MIN_NOTIONAL"]["notional"])
+            rules["tickSize"] = float(
+                filters.get("PRICE_FILTER", {}).get("tickSize", 10 ** -rules["pricePrecision"])
+            )
             rules["quantityPrecision"] = int(
                 rules_json["quantityPrecision"]
             )  # Base asset precision
         except Exception as e:
-            print(f"Error in {fn}\n{e}")
+            console_print(f"Error in {fn}\n{e}")
             exit()
 
         return rules
@@ -1216,27 +1541,22 @@ class Strat(Vanilla):
             "minQty": 1,
             "notional": 0.0001,
             "stepSize": 0.1,
+            "tickSize": 0.000001,
         }
 
         exc = "Bybit Perpetual"
         local_fn = f"{exc.replace(' ', '')}ExchangeInfo.json"
 
         try:
-            with open(local_fn) as f:
-                data = json.load(f)
+            # TODO: Add USD pairs later!
+            rules_json = rules_index(local_fn).get(self._symbol.replace("-", ""))
         except Exception as e:
-            print(f"Error in {local_fn}")
-            print(e)
+            console_print(f"Error in {local_fn}")
+            console_print(e)
             exit()
 
-        for i in data["result"]:
-            # TODO: Add USD pairs later!
-            if i["name"] == self._symbol.replace("-", ""):
-                rules_json = i
-                break
-
         if rules_json is None:
-            print(f"Error in rules_json. {local_fn}")
+            console_print(f"Error in rules_json. {local_fn}")
             exit()
 
         try:
@@ -1250,6 +1570,9 @@ class Strat(Vanilla):
         rules["pricePrecision"] = rules_json["price_scale"]
         rules["minQty"] = float(rules_json["lot_size_filter"]["min_trading_qty"])
         rules["stepSize"] = float(rules_json["lot_size_filter"]["qty_step"])
+        rules["tickSize"] = float(
+            rules_json.get("price_filter", {}).get("tick_size", 10 ** -int(rules["pricePrecision"]))
+        )
 
         #  TODO Bybit has no notional rules. Just keep it very low to make minQty priority.
         rules["notional"] = 0.00001
@@ -1318,16 +1641,17 @@ class Strat(Vanilla):
             f"{self.exchange}-{self.symbol}-{strategy_name}-{self.leverage}-{self.timeframe}-{self.app_port}.pickle"
         )
 
+    @profiled()
     def binance_ob_ticker(self):
         order_book_url = f"https://fapi.binance.com/fapi/v1/ticker/bookTicker?symbol={self.symbol.replace('-', '')}"
 
         # start = time.time()
 
         try:
-            data = requests.get(order_book_url).json()
+            data = downloader.get(order_book_url).json()
             return data
         except Exception as e:
-            print(e)
+            console_print(e)
             return ""
 
     @property
@@ -1364,53 +1688,61 @@ class Strat(Vanilla):
         We need to add some time to latest candle's ts.
         (timeframe at this case)
         """
-        timeframe = 300000
-        try:
-            timeframe = self.candles[-1][0] - self.candles[-2][0]
-        except:
-            pass
+        return self.current_candle[0] + self.timeframe_ms
+
+    @property
+    def timeframe_ms(self):
+        """
+        Candle length in ms of self.timeframe, see env.TIMEFRAME_MS.
+        Unknown timeframes are measured from the last two candles (not cached, a gap would stick), 5m without candles.
+        """
+        if self._timeframe_ms is None:
+            self._timeframe_ms = env.TIMEFRAME_MS.get(self.timeframe, 0)
 
-        return self.current_candle[0] + timeframe
+        if self._timeframe_ms:
+            return self._timeframe_ms
+
+        try:
+            return self.candles[-1][0] - self.candles[-2][0]
+        except (IndexError, TypeError):
+            return 300000
 
     @property
     def ts(self):
+        """Formatted once per second (live) or per candle (backtest)."""
         if is_live():
-            return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            key = int(time.time())
         else:
-            return datetime.datetime.utcfromtimestamp(self.now/ 1000).strftime("%Y-%m-%d %H:%M:%S")
+            key = self.now
 
-    def console(self, msg, send_notification=True, force=False):
-        if self.log_enabled or force:
+        if key != self._ts_key:
             if is_live():
-                if (
-                    version("jesse").split(".")[0] == "0"
-                    and int(version("jesse").split(".")[1]) < 36
-                ):
-                    self.log(f"{self.ts} {self.symbol} {msg}")
-                else:
-                    self.log(
-                        f"{self.ts} {self.symbol} {msg}",
-                        send_notification=send_notification,
-                    )
+                self._ts = datetime.datetime.fromtimestamp(key).strftime("%Y-%m-%d %H:%M:%S")
             else:
-                # self.jesse_version()
-                print(f"\n{self.ts} {self.symbol} {msg}")
+                self._ts = datetime.datetime.utcfromtimestamp(key / 1000).strftime("%Y-%m-%d %H:%M:%S")
+            self._ts_key = key
+        return self._ts
+
+    def console(self, msg, send_notification=True, force=False, **fields):
+        """msg can be a callable, it's only formatted if log_enabled (or force) lets it through."""
+        self.logger.emit(WARNING if force else INFO, msg, send_notification, **fields)
+
+    def jesse_log(self, text, send_notification=None):
+        if send_notification is None:
+            self.log(text)
+        elif not env.jesse_has_send_notification():
+            self.log(text)
+        else:
+            self.log(text, send_notification=send_notification)
 
     def jesse_version(self):
-        if (
-            version("jesse").split(".")[0] == "0"
-            and int(version("jesse").split(".")[1]) < 36
-        ):
-            print(f"\nJesse version < 0.36.0, Installed: {version('jesse')}")
+        if not env.jesse_has_send_notification():
+            console_print(f"\nJesse version < 0.36.0, Installed: {env.jesse_version()}")
         else:
-            print(f"\nJesse version >= 0.36.0, Installed: {version('jesse')}")
+            console_print(f"\nJesse version >= 0.36.0, Installed: {env.jesse_version()}")
 
-    def debug(self, msg):
-        if self.debug_enabled:
-            if is_live():
-                self.log(f"{self.ts} {self.symbol} {msg}")
-            else:
-                print(f"{self.ts} {self.symbol} {msg}")
+    def debug(self, msg, **fields):
+        self.logger.debug(msg, **fields)
 
     def log_metrics_after_closing(self, metrics):
         self.console(
@@ -1433,26 +1765,22 @@ class Strat(Vanilla):
         # msg = f"Balance: {self.initial_balance:0.2f} -> {self.balance:0.2f}, Profit: {self.balance - self.initial_balance:0.2f}"
         self.to_discord(self.wallets_dc_hook, bot_name, msg)
 
+    @profiled()
     def to_discord(self, hook_url=None, username="None", msg="None"):
         data = {"content": msg, "username": username}
 
         if is_live():
             if not hook_url:
-                print(f"\n{self.ts} {self.symbol} Check custom hook url in .env file!")
+                console_print(f"\n{self.ts} {self.symbol} Check custom hook url in .env file!")
                 return
 
-            try:
-                result = requests.post(hook_url, json=data)
-                result.raise_for_status()
-            except requests.exceptions.HTTPError as err:
-                self.console(err, False)
-            else:
-                self.console(
-                    f"Payload delivered successfully, code {result.status_code}.", False
-                )
+            # Delivered by the background dispatcher, a slow webhook can't stall the candle loop.
+            if not dispatcher.send(hook_url, username, msg):
+                self.console(f"Notification queue is full, message dropped. {dispatcher.stats}", False)
         elif self.log_enabled:
-            print(f"{self.ts} {self.symbol} {data}")
+            console_print(f"{self.ts} {self.symbol} {data}")
 
+    @profiled()
     def watch_list(self) -> list:
         wl = [("Status", "Not ready.")]
 
@@ -1566,7 +1894,8 @@ class Strat(Vanilla):
         return wl
 
     def terminate(self):
-        print(f"Standalone Strategy Template v. {version('strat')}")
+        flusher.flush_all()
+        console_print(f"Standalone Strategy Template v. {version('strat')}")
 
         try:
             self.test_max_pos_size_vs_leverage()
@@ -1574,7 +1903,7 @@ class Strat(Vanilla):
             self.console("Max. position size vs leverage test failed.")
 
         try:
-            print(
+            console_print(
                 f"{self.symbol} Max. re-entry: {self.max_open_positions}, "
                 f"Max. Position Value: {self.max_position_value:0.2f}, "
                 f"Min. Margin: {self.shared_vars['min_margin']:.0f}, "
@@ -1585,32 +1914,32 @@ class Strat(Vanilla):
                 f"Parameters: {self.hp}"
             )
 
-            print(
+            console_print(
                 f"\n{'Max. Margin Ratio':<24}| {self.shared_vars['max_margin_ratio']}%"
             )
-            print(f"{'Minimum Margin':<24}| {round(self.shared_vars['min_margin'])}")
-            print(
+            console_print(f"{'Minimum Margin':<24}| {round(self.shared_vars['min_margin'])}")
+            console_print(
                 f"{'Annual/MR':<24}| {self.metrics['annual_return'] / (self.shared_vars['max_margin_ratio'] * 2):0.2f}"
             )
-            print(
+            console_print(
                 f"{'Shared Max. Total Value':<24}| {self.shared_vars['max_total_value']:0.2f}"
             )
-            print(f"{'Max. LP Ratio':<24}| {self.shared_vars['max_lp_ratio']:0.02f}")
+            console_print(f"{'Max. LP Ratio':<24}| {self.shared_vars['max_lp_ratio']:0.02f}")
             # print(f"{'Insuff. Margin Count':<24}| {self.insuff_margin_count}")
             # print(f"{'Insuff. Margin Count':<24}| {self.max_insuff_margin_count}")
-            print(
+            console_print(
                 f"{'Trades have Insuff. Margin Count':<24}| {self.unique_insuff_margin_count}"
             )
-            print(f"{'uDD Ratio':<24}| {self.dd['min_pnl_ratio']:0.3f}")
+            console_print(f"{'uDD Ratio':<24}| {self.dd['min_pnl_ratio']:0.3f}")
 
         except Exception as e:
-            print(f"{self.symbol} Error printing extra metrics! {e}")
+            console_print(f"{self.symbol} Error printing extra metrics! {e}")
 
         try:
             if metrics := self.metrics:
                 net_profit_percentage = metrics["net_profit_percentage"]
                 profit_per_udd = net_profit_percentage / abs(self.dd["min_pnl_ratio"])
-                print(f"{'ppudd Ratio':<24}| {profit_per_udd:0.2f}")
+                console_print(f"{'ppudd Ratio':<24}| {profit_per_udd:0.2f}")
         except Exception as e:
             pass
 
@@ -1620,13 +1949,13 @@ class Strat(Vanilla):
         #     print(e)
 
         try:
-            print(f"{'udd stop Count':<24}| {self.udd_stop_count}")
-            print("udd stop Events: ", self.udd_stop_events)
+            console_print(f"{'udd stop Count':<24}| {self.udd_stop_count}")
+            console_print("udd stop Events: ", self.udd_stop_events)
         except Exception as e:
             pass
         
         try:
-            print(f"{'Min. PNL at stoploss':<24}| {self.min_pnl_at_stoploss:0.2f}")
+            console_print(f"{'Min. PNL at stoploss':<24}| {self.min_pnl_at_stoploss:0.2f}")
         except Exception as e:
             pass
 
@@ -1635,18 +1964,35 @@ class Strat(Vanilla):
         # except Exception as e:
         #     print(e)
 
-        if not self.is_trading and self.kill_sw_file in os.listdir():
-            print(f"Removing {self.kill_sw_file=} file.")
+        if not self.is_trading and control_files.exists(self.kill_sw_file, max_age=0):
+            console_print(f"Removing {self.kill_sw_file=} file.")
             try:
                 os.remove(self.kill_sw_file)
             except Exception as e:
-                print(f"Could not remove {self.kill_sw_file}\n {e}")
+                console_print(f"Could not remove {self.kill_sw_file}\n {e}")
 
         if "--light-reports" in sys.argv:
-            print("\nCreating light reports...")
+            console_print("\nCreating light reports...")
             try:
                 JesseTradingViewLightReport.generateReport()
             except Exception as e:
-                print(e, "JesseTradingViewLightReport is not available, skipping...")
+                console_print(e, "JesseTradingViewLightReport is not available, skipping...")
+
+        if self.session_journal is not None:
+            self.session_journal.close()
+
+        if profiler.enabled and not profiler.reported:
+            profiler.reported = True
+            console_print(profiler.report())
+            if self.profile_file:
+                console_print(f"Profile saved to {profiler.dump(self.profile_file)}")
+
+        try:
+            if fname := self.export_metrics():
+                console_print(f"Metrics of {self.metric_recorder.size} candles saved to {fname}")
+        except Exception as e:
+            console_print(f"{self.symbol} Failed to export metrics! {e}")
+
+        flusher.flush_all()
 
         # print(self.watch_list())
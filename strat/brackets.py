@@ -0,0 +1,581 @@
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from bisect import bisect_right
+from pathlib import Path
+from types import MappingProxyType
+
+
+class TierTable:
+    """
+    Leverage/risk tiers of one symbol compiled into sorted arrays.
+    lookup() bisects the notional caps and returns a shared read-only record,
+    the last hit tier is remembered so steady position values skip the search.
+    """
+
+    def __init__(self, caps, records, fallback, fixed_margin_ratio=None):
+        self.caps = caps
+        self.floors = [float("-inf")] + caps[:-1] if caps else []
+        self.records = records
+        self.fallback = fallback
+        self.fixed_margin_ratio = fixed_margin_ratio
+
+        # Column views, handy for vectorized use and debugging.
+        self.mmrs = [r["maintMarginRatio"] for r in records]
+        self.cums = [r["maintAmount"] for r in records]
+        self.leverages = [r["initialLeverage"] for r in records]
+        self.brackets = [r["bracket"] for r in records]
+
+        self._lo = float("inf")
+        self._hi = float("-inf")
+        self._hit = fallback
+
+    def __len__(self):
+        return len(self.caps)
+
+    def index(self, psize):
+        """Index of the first tier with psize < notionalCap, len(self) if none."""
+        return bisect_right(self.caps, psize)
+
+    def lookup(self, psize):
+        if self._lo <= psize < self._hi:
+            return self._hit
+
+        i = bisect_right(self.caps, psize)
+
+        if i < len(self.caps):
+            self._lo, self._hi, self._hit = self.floors[i], self.caps[i], self.records[i]
+        else:
+            self._lo = self.caps[-1] if self.caps else float("-inf")
+            self._hi, self._hit = float("inf"), self.fallback
+
+        return self._hit
+
+    @staticmethod
+    def _record(bracket, leverage, cap, floor, mmr, cum):
+        return MappingProxyType(
+            {
+                "bracket": bracket,
+                "initialLeverage": leverage,
+                "notionalCap": cap,
+                "notionalFloor": floor,
+                "maintMarginRatio": mmr,
+                "maint_amount": 0.0,
+                "maintAmount": cum,
+            }
+        )
+
+    @classmethod
+    def _compile(cls, rows, fallback_mmr, fixed_margin_ratio):
+        """
+        rows: (bracket, leverage, cap, floor, mmr, cum) in exchange order.
+        Tiers that can never be the first match (cap not above an earlier cap) are dropped,
+        so bisecting the remaining caps gives the same answer as the old linear scan.
+        """
+        fixed = isinstance(fixed_margin_ratio, (float, int))
+        caps, records = [], []
+
+        for bracket, leverage, cap, floor, mmr, cum in rows:
+            if caps and cap <= caps[-1]:
+                continue
+            caps.append(cap)
+            records.append(
+                cls._record(
+                    bracket, leverage, cap, floor, fixed_margin_ratio if fixed else mmr, cum
+                )
+            )
+
+        fallback = cls._record(0, 0, 0, 0, fallback_mmr, 0)
+        return cls(caps, records, fallback, fixed_margin_ratio)
+
+    @classmethod
+    def from_binance(cls, brackets, fixed_margin_ratio=None):
+        rows = [
+            (
+                b["bracket"],
+                b["initialLeverage"],
+                b["notionalCap"],
+                b["notionalFloor"],
+                b["maintMarginRatio"],
+                b["cum"],
+            )
+            for b in brackets
+        ]
+        # TODO: Bybit jsons are missing the last tiers' maintenance margin! Calculate next tiers.
+        return cls._compile(rows, 0.75, fixed_margin_ratio)
+
+    @classmethod
+    def from_bybit(cls, risk_limits, fixed_margin_ratio=None):
+        rl_base_value = None
+        for b in risk_limits:
+            if b["is_lowest_risk"] == 1:
+                rl_base_value = b["limit"]
+                break
+
+        rows = [
+            (
+                b["id"],
+                b["max_leverage"],
+                b["limit"],
+                # TODO: Do we really need it? There should be a difference between notionalFloor and previous tier's notionalCap.
+                b["limit"] - rl_base_value,
+                b["maintain_margin"],
+                0.0,  # TODO: Calculate for Bybit if available/needed
+            )
+            for b in risk_limits
+        ]
+        # Beyond the last listed tier (incremental tiers of old files included, see extend_bybit_tiers) its rate holds.
+        fallback_mmr = risk_limits[-1]["maintain_margin"] if risk_limits else 0.10
+        return cls._compile(rows, fallback_mmr, fixed_margin_ratio)
+
+
+def deep_sizeof(obj, seen=None):
+    """Rough recursive memory footprint of plain json-like containers."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_sizeof(i, seen) for i in obj)
+    return size
+
+
+# Binary bracket file layout (little endian):
+#   header:  magic, version, symbol count, source json size, mtime_ns and sha1
+#   index:   one fixed width entry per symbol -> record offset, record count
+#   records: bracket, initialLeverage, notionalCap, notionalFloor, maintMarginRatio, cum
+BIN_MAGIC = b"STBR"
+BIN_VERSION = 1
+BIN_HEADER = struct.Struct("<4sHHQq20s")
+BIN_SYMBOL_SIZE = 16
+BIN_INDEX = struct.Struct(f"<{BIN_SYMBOL_SIZE}sIH")
+BIN_RECORD = struct.Struct("<HHqqdd")
+
+
+def file_sha1(fname):
+    with open(fname, "rb") as f:
+        return hashlib.sha1(f.read()).digest()
+
+
+def convert_brackets(src, dst=None):
+    """
+    Convert a Binance leverage bracket json (eg. Binance_lev_brackets.json or .old)
+    into the compact binary format. Returns the destination path.
+    """
+    src = Path(src)
+    dst = Path(dst) if dst else src.with_suffix(".bin")
+
+    with open(src) as f:
+        data = json.load(f)
+
+    # First entry wins, same as the json lookup.
+    by_symbol = {}
+    for i in data:
+        by_symbol.setdefault(i["symbol"], i["brackets"])
+
+    st = src.stat()
+    header = BIN_HEADER.pack(
+        BIN_MAGIC, BIN_VERSION, len(by_symbol), st.st_size, st.st_mtime_ns, file_sha1(src)
+    )
+
+    index, records = [], []
+    offset = BIN_HEADER.size + BIN_INDEX.size * len(by_symbol)
+
+    for symbol, brackets in by_symbol.items():
+        key = symbol.encode()
+        # struct would silently cut longer names, two symbols could end up under one key.
+        if len(key) > BIN_SYMBOL_SIZE:
+            raise ValueError(f"Symbol {symbol!r} is longer than {BIN_SYMBOL_SIZE} bytes, can't be stored in {dst}")
+        index.append(BIN_INDEX.pack(key, offset, len(brackets)))
+        for b in brackets:
+            records.append(
+                BIN_RECORD.pack(
+                    b["bracket"],
+                    b["initialLeverage"],
+                    b["notionalCap"],
+                    b["notionalFloor"],
+                    b["maintMarginRatio"],
+                    b["cum"],
+                )
+            )
+            offset += BIN_RECORD.size
+
+    tmp = dst.with_suffix(dst.suffix + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(b"".join(index))
+        f.write(b"".join(records))
+    os.replace(tmp, dst)
+
+    print(f"{src} -> {dst}, {len(by_symbol)} symbols, {len(records)} brackets, {dst.stat().st_size} bytes")
+    return dst
+
+
+class BinaryBrackets:
+    """
+    Memory-mapped view of a binary bracket file.
+    Only the small symbol index is parsed on open, tiers are unpacked per symbol on demand.
+    """
+
+    def __init__(self, fname):
+        self.fname = Path(fname)
+
+        with open(self.fname, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, ver, count, self.src_size, self.src_mtime_ns, self.src_sha1 = BIN_HEADER.unpack_from(self.mm, 0)
+
+        if magic != BIN_MAGIC or ver != BIN_VERSION:
+            self.mm.close()
+            raise ValueError(f"{self.fname} is not a v{BIN_VERSION} bracket file")
+
+        self.index = {}
+        for i in range(count):
+            symbol, offset, n = BIN_INDEX.unpack_from(self.mm, BIN_HEADER.size + i * BIN_INDEX.size)
+            self.index[symbol.rstrip(b"\0").decode()] = (offset, n)
+
+    def is_fresh(self, src):
+        """True if the binary was built from the current content of src json."""
+        try:
+            st = Path(src).stat()
+        except OSError:
+            # No json to compare with, binary is all we have.
+            return True
+
+        if st.st_size != self.src_size:
+            return False
+
+        # mtime changes with every checkout, fall back to the content hash.
+        return st.st_mtime_ns == self.src_mtime_ns or file_sha1(src) == self.src_sha1
+
+    def get(self, symbol):
+        try:
+            offset, n = self.index[symbol]
+        except KeyError:
+            return None
+
+        return [
+            {
+                "bracket": bracket,
+                "initialLeverage": leverage,
+                "notionalCap": cap,
+                "notionalFloor": floor,
+                "maintMarginRatio": mmr,
+                "cum": cum,
+            }
+            for bracket, leverage, cap, floor, mmr, cum in BIN_RECORD.iter_unpack(
+                self.mm[offset: offset + n * BIN_RECORD.size]
+            )
+        ]
+
+    @classmethod
+    def open(cls, fname, src=None):
+        """Open fname if it exists and is not stale against src, None otherwise."""
+        if not Path(fname).exists():
+            return None
+
+        try:
+            binary = cls(fname)
+        except Exception as e:
+            print(f"Error loading binary brackets from: {fname}\n{e}")
+            return None
+
+        if src is not None and not binary.is_fresh(src):
+            print(f"{fname} is older than {src}, falling back to json.")
+            binary.mm.close()
+            return None
+
+        return binary
+
+
+class BracketStore:
+    """
+    Process-wide, lazily loaded leverage bracket data indexed by symbol.
+    All routes share one parsed copy instead of re-reading the json per Strat instance.
+    If a fresh binary copy (see convert_brackets) exists, symbols are read from it one by one
+    and the json is only parsed as a fallback.
+    """
+
+    def __init__(self, fname, bin_fname=None):
+        self.fname = Path(fname)
+        self.bin_fname = Path(bin_fname) if bin_fname else None
+        self.binary = None
+        self.by_symbol = None
+        self.load_count = 0
+        self.load_time = 0.0
+        self.memory = 0
+        self._lock = threading.Lock()
+
+    def load(self, force_reload=False):
+        with self._lock:
+            if self.by_symbol is not None and not force_reload:
+                return self.by_symbol
+
+            print("\nLoading Binance tier brackets from:", self.fname)
+            start = time.perf_counter()
+
+            try:
+                with open(self.fname) as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(os.listdir())
+                print(f"Error loading Binance tier brackets from: {self.fname}")
+                print(e)
+                data = []
+
+            # Keep the first entry like the old linear scan did.
+            by_symbol = {}
+            for i in data:
+                by_symbol.setdefault(i["symbol"], i["brackets"])
+
+            self.by_symbol = by_symbol
+            self.load_count += 1
+            self.load_time = time.perf_counter() - start
+            self.memory = deep_sizeof(by_symbol)
+
+            print(
+                f"Loaded {len(by_symbol)} symbols in {self.load_time * 1000:0.1f} ms, ~{self.memory / 1024:0.0f} KiB"
+            )
+            return by_symbol
+
+    def load_binary(self, force_reload=False):
+        with self._lock:
+            if self.binary is not None and not force_reload:
+                return self.binary
+
+            if self.binary:
+                self.binary.mm.close()
+
+            start = time.perf_counter()
+            self.binary = BinaryBrackets.open(self.bin_fname, self.fname) or False
+
+            if self.binary:
+                self.by_symbol = {}
+                self.load_count += 1
+                self.load_time = time.perf_counter() - start
+                self.memory = 0
+                print(f"\nLoading Binance tier brackets from: {self.bin_fname}")
+
+            return self.binary
+
+    def get(self, symbol, force_reload=False):
+        """Brackets of symbol (eg. BTCUSDT) or None if the symbol is unknown."""
+        if self.bin_fname is not None and (self.binary is None or force_reload):
+            self.load_binary(force_reload)
+
+        if self.binary:
+            try:
+                return self.by_symbol[symbol]
+            except KeyError:
+                brackets = self.binary.get(symbol)
+                if brackets is not None:
+                    self.by_symbol[symbol] = brackets
+                    self.memory += deep_sizeof(brackets)
+                return brackets
+
+        by_symbol = self.by_symbol
+        if by_symbol is None or force_reload:
+            by_symbol = self.load(force_reload)
+        return by_symbol.get(symbol)
+
+    @property
+    def stats(self):
+        return {
+            "file": str(self.bin_fname if self.binary else self.fname),
+            "format": "binary" if self.binary else "json",
+            "loaded": self.by_symbol is not None,
+            "symbols": len(self.by_symbol) if self.by_symbol is not None else 0,
+            "load_count": self.load_count,
+            "load_time_ms": round(self.load_time * 1000, 3),
+            "memory_bytes": self.memory,
+        }
+
+
+binance_store = BracketStore(
+    Path(__file__).parent / "Binance_lev_brackets.json",
+    Path(__file__).parent / "Binance_lev_brackets.bin",
+)
+
+
+def normalize_bybit_tier(item):
+    """v5 /market/risk-limit item -> the v2 field names bybit_limits uses."""
+    return {
+        "id": int(item["id"]),
+        "symbol": item["symbol"],
+        "limit": float(item["riskLimitValue"]),
+        "maintain_margin": float(item["maintenanceMargin"]),
+        "starting_margin": float(item["initialMargin"]),
+        "is_lowest_risk": int(item["isLowestRisk"]),
+        "max_leverage": float(item["maxLeverage"]),
+    }
+
+
+def extend_bybit_tiers(tiers, max_tiers=None):
+    """
+    Append the incremental tiers the old (v2) per symbol files don't list:
+    New Risk Limit = RL Base value + (Number of incremental * RL incremental value)
+    New MM % = MM Base rate + (Number of incremental * MM incremental rate), same for IM %.
+    Increments are taken from the last two listed tiers. The formula ends where the initial
+    (or maintenance) margin rate reaches 100%, ie. 1x max. leverage, that is the symbol's last tier,
+    eg. 1% IM + 0.75% per step gives 132 tiers. max_tiers optionally caps the added tiers further.
+    """
+    tiers = sorted((t for t in tiers if not t.get("incremental")), key=lambda t: t["limit"])
+    if len(tiers) < 2:
+        return tiers
+
+    last, prev = tiers[-1], tiers[-2]
+    d_limit = last["limit"] - prev["limit"]
+    d_mm = last["maintain_margin"] - prev["maintain_margin"]
+    d_im = last["starting_margin"] - prev["starting_margin"]
+
+    if d_limit <= 0 or (d_mm <= 0 and d_im <= 0):
+        return tiers
+
+    # Steps until a rate reaches 100%.
+    steps = [math.ceil(round((1.0 - last[k]) / d, 9)) for k, d in (("starting_margin", d_im), ("maintain_margin", d_mm)) if d > 0]
+    n_tiers = max(min(steps), 0)
+    if max_tiers is not None:
+        n_tiers = min(n_tiers, max_tiers)
+
+    extended = list(tiers)
+    for n in range(1, n_tiers + 1):
+        mm = min(last["maintain_margin"] + n * d_mm, 1.0)
+        im = min(last["starting_margin"] + n * d_im, 1.0)
+        extended.append(
+            {
+                "id": last["id"] + n,
+                "symbol": last.get("symbol"),
+                "limit": last["limit"] + n * d_limit,
+                "maintain_margin": round(mm, 10),
+                "starting_margin": round(im, 10),
+                "is_lowest_risk": 0,
+                "max_leverage": round(1 / im, 2) if im > 0 else last["max_leverage"],
+                "incremental": True,
+            }
+        )
+
+    return extended
+
+
+class BybitRiskStore:
+    """
+    All Bybit linear risk limits in one consolidated, symbol indexed file (bybit/risk-limits.json),
+    downloaded in one bulk (paginated) pass instead of one request and one file per symbol.
+    The v5 API lists every tier of a symbol, old per symbol files are migrated with
+    their incremental tiers precomputed, see extend_bybit_tiers.
+    Symbols missing from the store trigger at most one bulk refresh per refresh_ttl seconds.
+    """
+
+    url = "https://api.bybit.com/v5/market/risk-limit?category=linear"
+    refresh_ttl = 60 * 60
+
+    def __init__(self, fname):
+        self.fname = Path(fname)
+        self.by_symbol = None
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+
+    def download(self):
+        from .downloads import downloader
+
+        items, cursor = [], None
+        while True:
+            url = f"{self.url}&cursor={cursor}" if cursor else self.url
+            data = downloader.get_json(url)
+            if data.get("retCode") != 0:
+                raise ValueError(f"Bybit risk limit download failed: {data.get('retMsg')}")
+            items.extend(data["result"]["list"])
+            cursor = data["result"].get("nextPageCursor")
+            if not cursor:
+                break
+
+        by_symbol = {}
+        for item in items:
+            by_symbol.setdefault(item["symbol"], []).append(normalize_bybit_tier(item))
+
+        return {symbol: sorted(tiers, key=lambda t: t["limit"]) for symbol, tiers in by_symbol.items()}
+
+    def save(self):
+        self.fname.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.fname.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"updated": time.time(), "source": self.url, "symbols": self.by_symbol}, f)
+        os.replace(tmp, self.fname)
+        print(f"Bybit risk limits of {len(self.by_symbol)} symbols saved to '{self.fname}'.")
+
+    def load(self, force_reload=False):
+        with self._lock:
+            if self.by_symbol is not None and not force_reload:
+                return self.by_symbol
+
+            print(f"\nLoading risk limits from {self.fname}")
+            try:
+                with open(self.fname) as f:
+                    self.by_symbol = json.load(f)["symbols"]
+            except FileNotFoundError:
+                self.by_symbol = {}
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"Can not read the Bybit risk limit store {self.fname}: {e!r}") from e
+
+            return self.by_symbol
+
+    def refresh(self):
+        """Bulk download all symbols and rewrite the store."""
+        with self._lock:
+            self.refreshed_at = time.time()
+            by_symbol = self.download()
+            self.by_symbol = {**(self.by_symbol or {}), **by_symbol}
+            self.save()
+
+    def get(self, symbol, legacy_fname=None, force_reload=False):
+        """
+        Tiers of symbol (eg. BTCUSDT). A symbol missing from the store is taken from an old
+        per symbol file (bybit/risk-limit-{symbol}.json) if there is one, so offline backtests
+        never wait on the network. Only then one bulk refresh is downloaded, unless the last one
+        is younger than refresh_ttl (or force_reload is set).
+        """
+        tiers = self.load(force_reload).get(symbol)
+        if tiers is not None:
+            return tiers
+
+        if legacy_fname and os.path.exists(legacy_fname):
+            try:
+                with open(legacy_fname) as f:
+                    tiers = extend_bybit_tiers(json.load(f)["result"])
+                with self._lock:
+                    self.by_symbol[symbol] = tiers
+                    self.save()
+                return tiers
+            except Exception as e:
+                print(f"Error loading Bybit risk limits from {legacy_fname}\n{e}")
+
+        if not force_reload and self.refreshed_at is not None and time.time() - self.refreshed_at < self.refresh_ttl:
+            return None
+
+        try:
+            print(f"Can not find Bybit risk limit for {symbol} in {self.fname}, will download from Bybit API")
+            self.refresh()
+            tiers = self.by_symbol.get(symbol)
+        except Exception as e:
+            print(f"Failed to download {self.url}\n{e}")
+
+        return tiers
+
+
+bybit_store = BybitRiskStore(Path("bybit") / "risk-limits.json")
+
+
+if __name__ == "__main__":
+    # python -m strat.brackets [src.json] [dst.bin]
+    convert_brackets(*(sys.argv[1:] or [binance_store.fname, binance_store.bin_fname]))
@@ -0,0 +1,59 @@
+import functools
+import inspect
+import math
+
+# Bumped every time a route publishes its state to shared_vars,
+# so aggregates read from other routes are never served stale.
+shared_revision = 0
+
+
+def bump_shared_revision():
+    global shared_revision
+    shared_revision += 1
+
+
+def same_value(a, b):
+    if isinstance(a, float) and isinstance(b, float):
+        return a == b or (math.isnan(a) and math.isnan(b)) or math.isclose(a, b, rel_tol=1e-9)
+    return a == b
+
+
+def candle_cached(fn):
+    """
+    Memoize a risk metric for the current candle and position state.
+    Entries are dropped when the candle, price, position qty, entry price, balance
+    or any route's shared_vars record changes.
+    Only for methods without arguments and without side effects: the entry is keyed by name only,
+    and with self.metric_cache_debug enabled every hit is recomputed and compared.
+    Checks and max. tracking go in an uncached caller (eg. margin_ratio around _margin_ratio).
+    """
+    name = fn.__name__
+    params = list(inspect.signature(fn).parameters)
+    if params[1:]:
+        raise TypeError(f"candle_cached can't wrap {name}{tuple(params)}, the cache key ignores arguments")
+
+    @functools.wraps(fn)
+    def wrapper(self):
+        if not self.metric_cache_enabled:
+            return fn(self)
+
+        key = self.metric_cache_key
+        if key != self._metric_cache_key:
+            self._metric_cache_key = key
+            self._metric_cache = {}
+
+        try:
+            value = self._metric_cache[name]
+        except KeyError:
+            value = self._metric_cache[name] = fn(self)
+            return value
+
+        if self.metric_cache_debug:
+            fresh = fn(self)
+            if not same_value(value, fresh):
+                print(f"\nMetric cache mismatch! {self.symbol} {name}: cached={value}, fresh={fresh}, key={key}")
+                self._metric_cache[name] = value = fresh
+
+        return value
+
+    return wrapper
@@ -0,0 +1,57 @@
+import os
+import threading
+import time
+
+
+class ControlFiles:
+    """
+    Kill switch, pause and break even files shared by all routes.
+    Instead of an os.listdir() per check, the watched files' flags are cached and refreshed
+    at most every interval seconds (the latency bound). A refresh is a single stat of the directory,
+    the watched files are only stat'ed again when the directory changed.
+    """
+
+    def __init__(self, directory=".", interval=1.0):
+        self.directory = directory
+        self.interval = interval
+        self.flags = {}
+        self._dir_mtime_ns = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _exists(self, name):
+        try:
+            os.stat(os.path.join(self.directory, name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked < self.interval:
+            return
+
+        with self._lock:
+            mtime_ns = os.stat(self.directory).st_mtime_ns
+            # Coarse filesystem timestamps can hide a change made in the same tick, re-check while recent.
+            recent = time.time_ns() - mtime_ns < 2_000_000_000
+            if force or recent or mtime_ns != self._dir_mtime_ns:
+                self.flags = {name: self._exists(name) for name in self.flags}
+                self._dir_mtime_ns = mtime_ns
+            self._checked = now
+
+    def exists(self, name, max_age=None):
+        """Cached flag of a control file, max_age=0 forces a fresh check."""
+        if name not in self.flags:
+            with self._lock:
+                self.flags[name] = self._exists(name)
+            return self.flags[name]
+
+        if max_age is not None and time.monotonic() - self._checked >= max_age:
+            self.refresh(force=True)
+        else:
+            self.refresh()
+        return self.flags[name]
+
+
+control_files = ControlFiles()
@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def meta_fname(local_fn):
+    """Sidecar with the ETag/Last-Modified of a downloaded file."""
+    return f"{local_fn}.meta"
+
+
+class Downloader:
+    """
+    Shared HTTP client: one pooled session with timeouts and retries.
+    Identical requests made at the same time (eg. several routes starting together) are merged into one,
+    downloads saved to a file are conditional (ETag / If-Modified-Since) so unchanged data costs a 304.
+    """
+
+    def __init__(self, timeout=(5, 30), retries=3, backoff=0.5, pool_size=16, max_workers=4):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.max_workers = max_workers
+        self._session = None
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    retry = Retry(
+                        total=self.retries,
+                        backoff_factor=self.backoff,
+                        status_forcelist=(429, 500, 502, 503, 504),
+                        respect_retry_after_header=True,
+                    )
+                    adapter = HTTPAdapter(
+                        pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry
+                    )
+                    session = requests.Session()
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    def _single_flight(self, key, fn):
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.post(url, **kwargs)
+
+    def get_json(self, url):
+        """GET and decode json, concurrent calls for the same url share one request."""
+
+        def fetch():
+            response = self.get(url)
+            response.raise_for_status()
+            return response.json()
+
+        return self._single_flight(("json", url), fetch)
+
+    def get_json_if_modified(self, url, local_fn, save=None):
+        """
+        Conditional GET against a previously saved local_fn.
+        Returns the decoded json, or None if the server says local_fn is still current
+        (its mtime is refreshed so TTL checks see it as fresh).
+        save(data) writes local_fn and returns True on success, the ETag/Last-Modified sidecar
+        is only written after that, so a failed save can't turn later requests into 304s for a stale file.
+        """
+
+        def fetch():
+            headers = {}
+            meta = {}
+            if os.path.exists(local_fn):
+                try:
+                    with open(meta_fname(local_fn)) as f:
+                        meta = json.load(f)
+                except Exception:
+                    meta = {}
+                if meta.get("etag"):
+                    headers["If-None-Match"] = meta["etag"]
+                if meta.get("last_modified"):
+                    headers["If-Modified-Since"] = meta["last_modified"]
+
+            response = self.get(url, headers=headers)
+
+            if response.status_code == 304:
+                Path(local_fn).touch()
+                return None
+
+            response.raise_for_status()
+            data = response.json()
+
+            if save is None or not save(data):
+                return data
+
+            meta = {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+            try:
+                with open(meta_fname(local_fn), "w") as f:
+                    json.dump(meta, f)
+            except Exception as e:
+                print(f"Failed to save {meta_fname(local_fn)}\n{e}")
+
+            return data
+
+        return self._single_flight(("file", url, str(local_fn)), fetch)
+
+    def run_many(self, jobs):
+        """Run independent download callables in parallel, returns their results (or exceptions) in order."""
+
+        def call(job):
+            try:
+                return job()
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, max(len(jobs), 1))) as pool:
+            return list(pool.map(call, jobs))
+
+
+downloader = Downloader()
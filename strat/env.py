@@ -0,0 +1,37 @@
+from functools import lru_cache
+from importlib.metadata import version
+
+
+@lru_cache(maxsize=None)
+def jesse_version():
+    """Installed Jesse version, read from the package metadata once per process."""
+    return version("jesse")
+
+
+@lru_cache(maxsize=None)
+def jesse_has_send_notification():
+    """Strategy.log accepts send_notification since Jesse 0.36.0."""
+    major, minor = (int(v) for v in jesse_version().split(".")[:2])
+    return not (major == 0 and minor < 36)
+
+
+# Jesse timeframes -> candle length in ms
+TIMEFRAME_MS = {
+    "1m": 60_000,
+    "3m": 3 * 60_000,
+    "5m": 5 * 60_000,
+    "15m": 15 * 60_000,
+    "30m": 30 * 60_000,
+    "45m": 45 * 60_000,
+    "1h": 3_600_000,
+    "2h": 2 * 3_600_000,
+    "3h": 3 * 3_600_000,
+    "4h": 4 * 3_600_000,
+    "6h": 6 * 3_600_000,
+    "8h": 8 * 3_600_000,
+    "12h": 12 * 3_600_000,
+    "1D": 86_400_000,
+    "3D": 3 * 86_400_000,
+    "1W": 7 * 86_400_000,
+    "1M": 30 * 86_400_000,
+}
@@ -0,0 +1,179 @@
+import copy
+import os
+import pickle
+import struct
+import time
+import zlib
+from pathlib import Path
+
+JOURNAL_MAGIC = b"STJR"
+JOURNAL_VERSION = 1
+JOURNAL_HEADER = struct.Struct("<4sH")  # magic, version
+RECORD_HEADER = struct.Struct("<BIIQ")  # kind, payload length, crc32, sequence number
+
+SNAPSHOT = 1
+DELTA = 2
+
+
+def fsync_dir(path):
+    """Make a rename durable, not available on every platform."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class SessionJournal:
+    """
+    Append-only session state journal, replaces rewriting one pickle in place.
+    Each checkpoint appends a record with only the fields that changed (a full snapshot first),
+    records carry a length and crc32 so a torn write at the end is detected and dropped on replay.
+    Writes are flushed every time and fsync'ed in batches (fsync_every records or fsync_interval seconds).
+    After compact_every records the journal is rewritten as one snapshot into a temp file and renamed over.
+    """
+
+    def __init__(self, path, fsync_every=10, fsync_interval=5.0, compact_every=500):
+        self.path = Path(path)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self.state = None
+        self.seq = 0
+        self.records = 0
+        self._valid_end = 0
+        self._file = None
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def replay(self):
+        """State rebuilt from the journal (None if there is none), reading stops at the first damaged record."""
+        self.state, self.seq, self.records, self._valid_end = None, 0, 0, 0
+
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        if len(data) < JOURNAL_HEADER.size:
+            return None
+        magic, version = JOURNAL_HEADER.unpack_from(data)
+        if magic != JOURNAL_MAGIC or version != JOURNAL_VERSION:
+            raise ValueError(f"{self.path} is not a session journal (v{JOURNAL_VERSION})")
+
+        offset = self._valid_end = JOURNAL_HEADER.size
+        while offset + RECORD_HEADER.size <= len(data):
+            kind, length, crc, seq = RECORD_HEADER.unpack_from(data, offset)
+            start = offset + RECORD_HEADER.size
+            payload = data[start : start + length]
+            if len(payload) < length or zlib.crc32(payload) != crc or kind not in (SNAPSHOT, DELTA):
+                break
+            if kind == DELTA and self.state is None:
+                break
+
+            fields = pickle.loads(payload)
+            if kind == SNAPSHOT:
+                self.state = fields
+                self.records = 0
+            else:
+                self.state.update(fields)
+                self.records += 1
+
+            self.seq = seq
+            offset = self._valid_end = start + length
+
+        return copy.deepcopy(self.state)
+
+    def _open(self):
+        if self.state is None:
+            self.replay()
+
+        if self._valid_end:
+            self._file = open(self.path, "r+b")
+            # Drop a torn record left by a crash.
+            self._file.truncate(self._valid_end)
+            self._file.seek(self._valid_end)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "wb")
+            self._file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION))
+
+    @staticmethod
+    def _record(kind, seq, fields):
+        payload = pickle.dumps(fields, protocol=pickle.HIGHEST_PROTOCOL)
+        return RECORD_HEADER.pack(kind, len(payload), zlib.crc32(payload), seq) + payload
+
+    def _sync(self, force=False):
+        if not self._unsynced:
+            return
+        if force or self._unsynced >= self.fsync_every or time.monotonic() - self._synced_at >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+            self._synced_at = time.monotonic()
+
+    def append(self, state):
+        """Checkpoint state (a dict). Returns False if nothing changed since the last checkpoint."""
+        if self._file is None:
+            self._open()
+
+        if self.state is not None and self.records >= self.compact_every:
+            self.compact(state)
+            return True
+
+        if self.state is None:
+            kind, fields = SNAPSHOT, state
+        else:
+            kind, fields = DELTA, {k: v for k, v in state.items() if k not in self.state or self.state[k] != v}
+            if not fields:
+                return False
+
+        self.seq += 1
+        self._file.write(self._record(kind, self.seq, fields))
+        self._file.flush()
+        self._valid_end = self._file.tell()
+        self._unsynced += 1
+        self._sync()
+
+        # Copies, callers keep mutating their dicts (eg. dd) in place.
+        if kind == SNAPSHOT:
+            self.state = copy.deepcopy(fields)
+            self.records = 0
+        else:
+            self.state.update(copy.deepcopy(fields))
+            self.records += 1
+        return True
+
+    def compact(self, state=None):
+        """Rewrite the journal as a single snapshot, atomically."""
+        state = copy.deepcopy(self.state if state is None else state)
+        self.seq += 1
+
+        tmp = self.path.with_name(f"{self.path.name}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION))
+            f.write(self._record(SNAPSHOT, self.seq, state))
+            f.flush()
+            os.fsync(f.fileno())
+
+        if self._file is not None:
+            self._file.close()
+        os.replace(tmp, self.path)
+        fsync_dir(self.path.parent)
+
+        self._file = open(self.path, "ab")
+        self._valid_end = self._file.tell()
+        self._unsynced = 0
+        self.state = state
+        self.records = 0
+
+    def close(self):
+        if self._file is not None:
+            self._sync(force=True)
+            self._file.close()
+            self._file = None
@@ -0,0 +1,359 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from pathlib import Path
+
+from jesse.helpers import is_live
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
+class Record:
+    """One log event. msg is already formatted, fields keep the raw values for structured sinks."""
+
+    __slots__ = ("level", "created", "ts", "symbol", "msg", "fields", "send_notification")
+
+    def __init__(self, level, ts, symbol, msg, fields, send_notification):
+        self.level = level
+        self.created = time.time()
+        self.ts = ts
+        self.symbol = symbol
+        self.msg = msg
+        self.fields = fields
+        self.send_notification = send_notification
+
+    @property
+    def text(self):
+        return f"{self.ts} {self.symbol} {self.msg}"
+
+    def as_dict(self):
+        return {
+            "level": LEVEL_NAMES.get(self.level, self.level),
+            "created": self.created,
+            "ts": self.ts,
+            "symbol": self.symbol,
+            "msg": self.msg,
+            **self.fields,
+        }
+
+
+class Logger:
+    """
+    Level gated logger. msg can be a callable (eg. lambda: f"..."), it's only called,
+    and the record only built, if at least one sink accepts the level.
+    context returns (ts, symbol) and is also only called for emitted records.
+    """
+
+    def __init__(self, context, sinks=()):
+        self.context = context
+        self.sinks = list(sinks)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def remove_sink(self, sink):
+        self.sinks.remove(sink)
+
+    def enabled(self, level):
+        return any(sink.accepts(level) for sink in self.sinks)
+
+    def emit(self, level, msg, send_notification=True, **fields):
+        sinks = [sink for sink in self.sinks if sink.accepts(level)]
+        if not sinks:
+            return False
+
+        if callable(msg):
+            msg = msg()
+        ts, symbol = self.context()
+        record = Record(level, ts, symbol, msg, fields, send_notification)
+
+        for sink in sinks:
+            sink.write(record)
+        return True
+
+    def debug(self, msg, **fields):
+        return self.emit(DEBUG, msg, False, **fields)
+
+    def info(self, msg, **fields):
+        return self.emit(INFO, msg, **fields)
+
+    def warning(self, msg, **fields):
+        return self.emit(WARNING, msg, **fields)
+
+    def error(self, msg, **fields):
+        return self.emit(ERROR, msg, **fields)
+
+
+class StrategySink:
+    """
+    The strategy's own output: Jesse's log in live mode, print in backtests.
+    DEBUG follows debug_enabled, INFO follows log_enabled, WARNING and above (forced messages) always pass.
+    Backtest output goes to stream (a StreamSink) instead of print if one is set.
+    Record fields: color (ANSI code) colors the line, raw=True writes msg as is (with end).
+    """
+
+    def __init__(self, strategy, stream=None):
+        self.strategy = strategy
+        self.stream = stream
+
+    def accepts(self, level):
+        if level >= WARNING:
+            return True
+        if level >= INFO:
+            return self.strategy.log_enabled
+        return self.strategy.debug_enabled
+
+    def _out(self, text, end="\n"):
+        if self.stream is None:
+            print(text, end=end)
+        else:
+            self.stream.write_text(text + end)
+
+    def write(self, record):
+        fields = record.fields
+
+        if fields.get("raw"):
+            self._out(record.msg, end=fields.get("end", "\n"))
+        elif "color" in fields:
+            self._out(f"\033[{fields['color']}m\n{record.text}\033[0m")
+        elif is_live():
+            if record.level >= INFO:
+                self.strategy.jesse_log(record.text, record.send_notification)
+            else:
+                self.strategy.jesse_log(record.text)
+        elif record.level >= INFO:
+            self._out(f"\n{record.text}")
+        else:
+            self._out(record.text)
+
+
+class Sink(ABC):
+    """Base of the level filtered sinks, each sink has its own level."""
+
+    def __init__(self, level=DEBUG):
+        self.level = level
+
+    def accepts(self, level):
+        return level >= self.level
+
+    @abstractmethod
+    def write(self, record):
+        ...
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class RingBufferSink(Sink):
+    """Keeps the last capacity records in memory, eg. to dump the context of an error."""
+
+    def __init__(self, capacity=1000, level=DEBUG):
+        super().__init__(level)
+        self.records = deque(maxlen=capacity)
+
+    def write(self, record):
+        self.records.append(record)
+
+    def lines(self):
+        return [record.text for record in self.records]
+
+
+class BufferedSink(Sink):
+    """
+    Collects formatted text in memory, the background flusher writes it out in batches
+    every flusher.interval seconds (or right away once max_buffer characters are pending).
+    """
+
+    def __init__(self, level=DEBUG, max_buffer=1 << 16):
+        super().__init__(level)
+        self.max_buffer = max_buffer
+        self._buffer = []
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        flusher.register(self)
+
+    def format(self, record):
+        return f"{record.text}\n"
+
+    def write(self, record):
+        self.write_text(self.format(record))
+
+    def write_text(self, text):
+        with self._lock:
+            self._buffer.append(text)
+            self._pending += len(text)
+            full = self._pending >= self.max_buffer
+        if full:
+            self.flush()
+
+    def flush(self):
+        # Writers only wait for the buffer swap, the I/O runs under its own lock (keeps batches in order).
+        with self._io_lock:
+            with self._lock:
+                if not self._buffer:
+                    return
+                texts = self._buffer
+                self._buffer = []
+                self._pending = 0
+            self._write(texts)
+
+    @abstractmethod
+    def _write(self, texts):
+        ...
+
+
+class StreamSink(BufferedSink):
+    """Batched writes to a stream (stdout by default)."""
+
+    def __init__(self, stream=None, level=DEBUG, max_buffer=1 << 16):
+        self.stream = stream
+        super().__init__(level, max_buffer)
+
+    def _write(self, texts):
+        stream = self.stream or sys.stdout
+        stream.write("".join(texts))
+        stream.flush()
+
+
+class RotatingFileSink(BufferedSink):
+    """
+    Batched log file, rotated by size: path -> path.1 -> ... -> path.{backups}.
+    fmt="json" writes one json object per record (Record.as_dict) instead of text lines.
+    """
+
+    def __init__(self, path, level=DEBUG, max_bytes=10 * 1024 * 1024, backups=5, fmt="text", max_buffer=1 << 16):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.fmt = fmt
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+        super().__init__(level, max_buffer)
+
+    def format(self, record):
+        if self.fmt == "json":
+            return json.dumps(record.as_dict(), default=str) + "\n"
+        if record.fields.get("raw"):
+            return f"{record.msg}\n"
+        return f"{LEVEL_NAMES.get(record.level, record.level)} {record.text}\n"
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            src = self.path.with_name(f"{self.path.name}.{i}")
+            if src.exists():
+                os.replace(src, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backups > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._size = 0
+
+    def _write(self, texts):
+        batch, size = [], self._size
+        for text in texts:
+            n = len(text.encode("utf-8"))
+            if size and size + n > self.max_bytes:
+                self._file.write("".join(batch))
+                self._rotate()
+                batch, size = [], 0
+            batch.append(text)
+            size += n
+        self._file.write("".join(batch))
+        self._file.flush()
+        self._size = size
+
+    def close(self):
+        super().close()
+        flusher.unregister(self)
+        self._file.close()
+
+
+class Flusher:
+    """One daemon thread flushing all buffered sinks, everything is flushed again at exit."""
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.sinks = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def register(self, sink):
+        with self._lock:
+            self.sinks.append(sink)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="strat-log-flusher", daemon=True)
+                self._thread.start()
+
+    def unregister(self, sink):
+        with self._lock:
+            if sink in self.sinks:
+                self.sinks.remove(sink)
+
+    def flush_all(self):
+        with self._lock:
+            sinks = list(self.sinks)
+        for sink in sinks:
+            try:
+                sink.flush()
+            except Exception as e:
+                print(f"Log flush failed: {e}", file=sys.stderr)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush_all()
+
+
+flusher = Flusher()
+atexit.register(flusher.flush_all)
+
+_file_sinks = {}
+_stdout_sink = None
+
+
+def file_sink(path, level=DEBUG, max_bytes=10 * 1024 * 1024, backups=5, fmt="text"):
+    """
+    Process-wide RotatingFileSink per path, routes logging to the same file share it.
+    Asking for an existing path with other settings raises ValueError.
+    """
+    key = str(Path(path).resolve())
+    sink = _file_sinks.get(key)
+    if sink is None:
+        sink = _file_sinks[key] = RotatingFileSink(path, level, max_bytes, backups, fmt)
+    elif (sink.level, sink.max_bytes, sink.backups, sink.fmt) != (level, max_bytes, backups, fmt):
+        raise ValueError(
+            f"Log file {path} is already open with level={sink.level}, max_bytes={sink.max_bytes}, "
+            f"backups={sink.backups}, fmt={sink.fmt!r}"
+        )
+    return sink
+
+
+def console_print(*args, **kwargs):
+    """print() that keeps its place in the console output, pending buffered stdout is written first."""
+    if _stdout_sink is not None:
+        _stdout_sink.flush()
+    print(*args, **kwargs)
+
+
+def stdout_sink():
+    """Shared buffered stdout for backtest console output."""
+    global _stdout_sink
+    if _stdout_sink is None:
+        _stdout_sink = StreamSink()
+    return _stdout_sink
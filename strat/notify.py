@@ -0,0 +1,215 @@
+import atexit
+import queue
+import threading
+import time
+from collections import defaultdict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DISCORD_MAX_LEN = 2000
+
+
+def chunk_lines(lines, limit=DISCORD_MAX_LEN):
+    """Join lines into as few messages as possible, each at most limit characters."""
+    chunks, current = [], ""
+    for line in lines:
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if current and len(current) + 1 + len(line) > limit:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class Dispatcher:
+    """
+    Background webhook sender, the strategy only enqueues.
+    One worker thread with a pooled session; messages queued within linger seconds
+    for the same hook and username are sent as one batched message.
+    Discord rate limits (429 retry_after, X-RateLimit-* headers) are respected.
+    If the queue is full new messages are dropped and counted, the next delivery
+    to that hook reports how many were lost.
+    """
+
+    def __init__(self, maxsize=1000, linger=0.5, timeout=(5, 15), max_attempts=3):
+        self.linger = linger
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._session = None
+        self._dropped = defaultdict(int)
+        self._blocked_until = 0.0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @property
+    def session(self):
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session = session
+        return self._session
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="strat-notify", daemon=True)
+                self._thread.start()
+
+    def send(self, hook_url, username, msg):
+        """Queue a message, never blocks. Returns False if it was dropped."""
+        self._start()
+        try:
+            self._queue.put_nowait((hook_url, username, str(msg), time.monotonic()))
+            return True
+        except queue.Full:
+            with self._lock:
+                self._dropped[(hook_url, username)] += 1
+                self.dropped += 1
+            return False
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.linger
+            while items[-1] is not None:
+                try:
+                    items.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+
+            stop = items[-1] is None
+            messages = [item for item in items if item is not None]
+
+            try:
+                self._deliver(messages)
+            except Exception as e:
+                print(f"Notification dispatcher error: {e}")
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+            if stop:
+                return
+
+    def _deliver(self, messages):
+        groups = defaultdict(list)
+        for hook_url, username, msg, queued_at in messages:
+            groups[(hook_url, username)].append((msg, queued_at))
+
+        for (hook_url, username), group in groups.items():
+            lines = [msg for msg, _ in group]
+            with self._lock:
+                lost = self._dropped.pop((hook_url, username), 0)
+            if lost:
+                lines.append(f"... {lost} message(s) dropped, notification queue was full.")
+
+            delivered = all(self._post(hook_url, username, chunk) for chunk in chunk_lines(lines))
+
+            now = time.monotonic()
+            with self._lock:
+                if delivered:
+                    self.sent += len(group)
+                    for _, queued_at in group:
+                        self.latency_total += now - queued_at
+                        self.latency_max = max(self.latency_max, now - queued_at)
+                else:
+                    self.failed += len(group)
+
+    def _post(self, hook_url, username, content):
+        for _ in range(self.max_attempts):
+            wait = self._blocked_until - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+            try:
+                response = self.session.post(
+                    hook_url, json={"content": content, "username": username}, timeout=self.timeout
+                )
+            except requests.exceptions.RequestException as e:
+                print(f"Notification to {username} failed: {e}")
+                time.sleep(1)
+                continue
+
+            headers = response.headers
+            if headers.get("X-RateLimit-Remaining") == "0":
+                self._blocked_until = time.monotonic() + float(headers.get("X-RateLimit-Reset-After", 1))
+
+            if response.status_code == 429:
+                try:
+                    retry_after = float(response.json()["retry_after"])
+                except Exception:
+                    retry_after = float(headers.get("Retry-After", 1))
+                self._blocked_until = time.monotonic() + retry_after
+                continue
+
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as err:
+                print(f"Notification to {username} failed: {err}")
+                return False
+
+            self.batches += 1
+            return True
+
+        return False
+
+    def flush(self, timeout=10):
+        """Wait until everything queued so far is delivered (or timeout). Returns True if the queue drained."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() > deadline or self._thread is None or not self._thread.is_alive():
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout=10):
+        """Flush and stop the worker, a later send() starts a new one."""
+        drained = self.flush(timeout)
+        if self._thread is not None and self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=1)
+                self._thread.join(timeout=max(timeout, 1))
+            except queue.Full:
+                pass
+        return drained
+
+    @property
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "avg_latency": self.latency_total / self.sent if self.sent else 0.0,
+            "max_latency": self.latency_max,
+        }
+
+
+dispatcher = Dispatcher()
+
+
+def close_at_exit(timeout=2):
+    """Deliver what's still queued once per process, shared by all routes (see Strat.terminate)."""
+    if not dispatcher.close(timeout):
+        print(f"Not all notifications were delivered: {dispatcher.stats}")
+
+
+atexit.register(close_at_exit)
@@ -0,0 +1,189 @@
+import math
+from collections.abc import MutableMapping
+
+from . import cache
+
+SCALE = 1_000_000  # Published values are rounded to 6 decimals, keep them as exact integers.
+
+
+def to_units(value):
+    """Integer micro units of a finite value, NaN and inf have none (see Portfolio.publish)."""
+    return int(round(value * SCALE)) if math.isfinite(value) else None
+
+
+def to_bool(value):
+    return value == "True" if isinstance(value, str) else bool(value)
+
+
+class RouteState(MutableMapping):
+    """
+    Native typed state of one route, updated in place every candle.
+    Stored as shared_vars[symbol] and read like the old per-candle dict:
+    state["active"] still gives "True"/"False" and numbers come back rounded.
+    Native values are available as attributes (state.active, state.pos_value, ...).
+    Strategies can still write to it: known keys are converted back to the native field
+    (pnl, pos_value and maintenance_margin are republished to the portfolio totals),
+    other keys are kept as extra per route values.
+    """
+
+    __slots__ = (
+        "symbol",
+        "portfolio",
+        "extra",
+        "active",
+        "is_open",
+        "pos_value",
+        "pnl",
+        "pnl_perc",
+        "max_open",
+        "cycle_pos",
+        "maintenance_margin",
+    )
+
+    VIEW = {
+        "active": lambda s: str(s.active),
+        "is_open": lambda s: str(s.is_open),
+        "pos_value": lambda s: round(s.pos_value, 6) if s.is_open else 0,
+        "pnl": lambda s: round(s.pnl, 6) if s.is_open else 0,
+        "pnl%": lambda s: round(s.pnl_perc, 6) if s.is_open else 0,
+        "max_open": lambda s: s.max_open,
+        "cycle_pos": lambda s: round(s.cycle_pos, 2),
+        "maintenance_margin": lambda s: round(s.maintenance_margin, 6),
+    }
+
+    # Writable keys -> (attribute, conversion)
+    FIELDS = {
+        "active": ("active", to_bool),
+        "is_open": ("is_open", to_bool),
+        "pos_value": ("pos_value", float),
+        "pnl": ("pnl", float),
+        "pnl%": ("pnl_perc", float),
+        "max_open": ("max_open", int),
+        "cycle_pos": ("cycle_pos", float),
+        "maintenance_margin": ("maintenance_margin", float),
+    }
+
+    PUBLISHED = ("pos_value", "pnl", "maintenance_margin")
+
+    def __init__(self, symbol, portfolio=None):
+        self.symbol = symbol
+        self.portfolio = portfolio
+        self.extra = {}
+        self.active = False
+        self.is_open = False
+        self.pos_value = 0.0
+        self.pnl = 0.0
+        self.pnl_perc = 0.0
+        self.max_open = 0
+        self.cycle_pos = 0
+        self.maintenance_margin = 0.0
+
+    def __getitem__(self, key):
+        try:
+            return self.VIEW[key](self)
+        except KeyError:
+            return self.extra[key]
+
+    def __setitem__(self, key, value):
+        try:
+            attr, convert = self.FIELDS[key]
+        except KeyError:
+            self.extra[key] = value
+            return
+
+        setattr(self, attr, convert(value))
+        if key in self.PUBLISHED and self.portfolio is not None:
+            self.portfolio.publish(self.symbol, self.maintenance_margin, self.pnl, self.pos_value)
+            cache.bump_shared_revision()
+
+    def __delitem__(self, key):
+        if key in self.VIEW:
+            raise KeyError(f"{key} is part of the route state and can't be removed")
+        del self.extra[key]
+
+    def __iter__(self):
+        yield from self.VIEW
+        yield from self.extra
+
+    def __len__(self):
+        return len(self.VIEW) + len(self.extra)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class Portfolio(dict):
+    """
+    Running totals of the metrics every route publishes in update_shared_vars.
+    Each publish applies the route's delta, so multi route aggregates and
+    "all other routes" values (total - self) are O(1) instead of a loop over routes.
+    Totals are kept in integer micro units, deltas never drift.
+    NaN or inf values are kept aside as floats and added to the totals, so a broken value
+    of one route shows up in every total instead of being dropped.
+    Lives in shared_vars, it's a dict so json.dumps(shared_vars) keeps working.
+    """
+
+    FIELDS = ("maintenance_margin", "pnl", "pos_value")
+
+    def __init__(self):
+        super().__init__(maintenance_margin=0.0, pnl=0.0, pos_value=0.0, routes=0)
+        self.totals = dict.fromkeys(self.FIELDS, 0)
+        self.rows = {}
+        self.nonfinite = {}  # symbol -> row of the non-finite values (0.0 for finite ones)
+        self.states = {}
+
+    def route(self, symbol):
+        """The symbol's RouteState, created on first use."""
+        try:
+            return self.states[symbol]
+        except KeyError:
+            state = self.states[symbol] = RouteState(symbol, self)
+            return state
+
+    def retain(self, symbols):
+        """Drop routes that are not in symbols (eg. left over from an earlier run in the same process)."""
+        symbols = set(symbols)
+        for symbol in [s for s in self.rows if s not in symbols]:
+            self.publish(symbol, 0.0, 0.0, 0.0)
+            del self.rows[symbol]
+            self.nonfinite.pop(symbol, None)
+        for symbol in [s for s in self.states if s not in symbols]:
+            del self.states[symbol]
+        self["routes"] = len(self.rows)
+
+    def publish(self, symbol, maintenance_margin, pnl, pos_value):
+        values = (maintenance_margin, pnl, pos_value)
+        units = [to_units(v) for v in values]
+        row = tuple(0 if u is None else u for u in units)
+        old = self.rows.get(symbol, (0, 0, 0))
+        self.rows[symbol] = row
+
+        if None in units:
+            self.nonfinite[symbol] = tuple(0.0 if u is not None else float(v) for u, v in zip(units, values))
+        else:
+            self.nonfinite.pop(symbol, None)
+
+        for field, new_v, old_v in zip(self.FIELDS, row, old):
+            self.totals[field] += new_v - old_v
+            self[field] = self.total(field)
+
+        self["routes"] = len(self.rows)
+
+    def total(self, field):
+        total = self.totals[field] / SCALE
+        if self.nonfinite:
+            i = self.FIELDS.index(field)
+            total += sum(row[i] for row in self.nonfinite.values())
+        return total
+
+    def others(self, field, symbol):
+        """Total of field excluding the symbol's own contribution"""
+        own = self.rows.get(symbol)
+        if own is None:
+            return self.total(field)
+
+        i = self.FIELDS.index(field)
+        total = (self.totals[field] - own[i]) / SCALE
+        if self.nonfinite:
+            total += sum(row[i] for s, row in self.nonfinite.items() if s != symbol)
+        return total
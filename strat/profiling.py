@@ -0,0 +1,98 @@
+import functools
+import json
+import time
+from pathlib import Path
+
+
+class Profiler:
+    """
+    Call counts, total and max. time of the instrumented Strat methods, shared by all routes.
+    Disabled by default, a disabled hook costs one attribute check.
+    Times are inclusive, eg. update_shared_vars includes the margin_ratio call it makes.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stats = {}
+        self.candles = set()
+        self.reported = False
+
+    def enable(self):
+        self.enabled = True
+
+    def reset(self):
+        self.stats.clear()
+        self.candles.clear()
+        self.reported = False
+
+    def tick(self, ts):
+        """Count distinct candles, calls per candle are relative to this."""
+        self.candles.add(ts)
+
+    def add(self, name, elapsed_ns):
+        stat = self.stats.get(name)
+        if stat is None:
+            stat = self.stats[name] = [0, 0, 0]
+        stat[0] += 1
+        stat[1] += elapsed_ns
+        if elapsed_ns > stat[2]:
+            stat[2] = elapsed_ns
+
+    def rows(self):
+        candles = max(len(self.candles), 1)
+        rows = [
+            {
+                "name": name,
+                "calls": calls,
+                "total_ms": total / 1e6,
+                "max_us": worst / 1e3,
+                "avg_us": total / calls / 1e3,
+                "calls_per_candle": calls / candles,
+                "us_per_candle": total / candles / 1e3,
+            }
+            for name, (calls, total, worst) in self.stats.items()
+        ]
+        return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+    def report(self):
+        lines = [
+            f"\nStrat profile, {len(self.candles)} candles",
+            f"{'Name':<28}| {'Calls':>9} | {'Total ms':>10} | {'Avg us':>9} | {'Max us':>9} | {'Calls/candle':>12} | {'us/candle':>9}",
+        ]
+        for r in self.rows():
+            lines.append(
+                f"{r['name']:<28}| {r['calls']:>9} | {r['total_ms']:>10.2f} | {r['avg_us']:>9.2f} | "
+                f"{r['max_us']:>9.2f} | {r['calls_per_candle']:>12.2f} | {r['us_per_candle']:>9.2f}"
+            )
+        return "\n".join(lines)
+
+    def dump(self, fname):
+        fname = Path(fname)
+        fname.parent.mkdir(parents=True, exist_ok=True)
+        with open(fname, "w") as f:
+            json.dump({"candles": len(self.candles), "stats": self.rows()}, f, indent=2)
+        return fname
+
+
+profiler = Profiler()
+
+
+def profiled(name=None):
+    """Time calls of the decorated function while profiler.enabled, see Profiler."""
+
+    def decorator(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.add(label, time.perf_counter_ns() - start)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import numpy as np
+
+COLUMNS = (
+    ("ts", np.int64),
+    ("price", np.float64),
+    ("pos_value", np.float64),
+    ("maintenance_margin", np.float64),
+    ("margin_ratio", np.float64),
+    ("LP1", np.float64),
+    ("lp_rate", np.float64),
+    ("udd", np.float64),
+    ("avail_margin", np.float64),
+)
+
+
+class MetricRecorder:
+    """
+    Per candle risk metrics of one route in preallocated column arrays.
+    Capacity doubles when full (amortized O(1) appends, no per row objects),
+    or with max_rows set it works as a ring buffer keeping the newest rows.
+    One row per candle: appending the same ts again overwrites the last row.
+    """
+
+    def __init__(self, capacity=4096, max_rows=None):
+        self.max_rows = max_rows
+        capacity = min(capacity, max_rows) if max_rows else capacity
+        self.columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in COLUMNS}
+        self.size = 0
+        self.total = 0  # Rows ever appended, larger than size once a ring buffer wraps.
+
+    @property
+    def capacity(self):
+        return len(self.columns["ts"])
+
+    def _grow(self):
+        capacity = self.capacity * 2
+        if self.max_rows:
+            capacity = min(capacity, self.max_rows)
+        for name, values in self.columns.items():
+            grown = np.empty(capacity, dtype=values.dtype)
+            grown[: self.size] = values[: self.size]
+            self.columns[name] = grown
+
+    def append(self, ts, price, pos_value, maintenance_margin, margin_ratio, lp1, lp_rate, udd, avail_margin):
+        c = self.columns
+        last = (self.total - 1) % self.capacity
+        if self.size and c["ts"][last] == ts:
+            i = last
+        else:
+            if self.size == self.capacity and (not self.max_rows or self.capacity < self.max_rows):
+                self._grow()
+            i = self.total % self.capacity if self.size == self.capacity else self.size
+            self.total += 1
+            self.size = min(self.size + 1, self.capacity)
+
+        c["ts"][i] = ts
+        c["price"][i] = price
+        c["pos_value"][i] = pos_value
+        c["maintenance_margin"][i] = maintenance_margin
+        c["margin_ratio"][i] = margin_ratio
+        c["LP1"][i] = lp1
+        c["lp_rate"][i] = lp_rate
+        c["udd"][i] = udd
+        c["avail_margin"][i] = avail_margin
+
+    def arrays(self):
+        """Recorded rows in time order as a dict of arrays (copies)."""
+        if self.size < self.capacity or self.total == self.size:
+            return {name: values[: self.size].copy() for name, values in self.columns.items()}
+        start = self.total % self.capacity
+        return {name: np.roll(values, -start) for name, values in self.columns.items()}
+
+    def export(self, fname, **meta):
+        """Save as compressed .npz, meta values (eg. symbol, leverage) are stored as extra arrays."""
+        fname = Path(fname)
+        fname.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(fname, **self.arrays(), **{k: np.asarray(v) for k, v in meta.items()})
+        return fname
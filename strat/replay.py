@@ -0,0 +1,219 @@
+import math
+
+import numpy as np
+
+from .risk import risk_surface
+
+# Jesse candle columns
+TS, OPEN, CLOSE, HIGH, LOW, VOLUME = range(6)
+# price_column: low for longs, high for shorts, close while flat.
+ADVERSE = -1
+
+
+def _field(o, name):
+    return o[name] if isinstance(o, dict) else getattr(o, name)
+
+
+def fills_from_orders(orders):
+    """(ts, signed qty, price) fills of the executed orders, sorted by time."""
+    fills = []
+    for order in orders:
+        executed_at = _field(order, "executed_at")
+        if executed_at is None:
+            continue
+        fills.append((executed_at, float(_field(order, "qty")), float(_field(order, "price"))))
+
+    fills.sort(key=lambda f: f[0])
+    return fills
+
+
+def fills_from_trades(trades):
+    """
+    (ts, signed qty, price) fills of Jesse's completed trades, sorted by time.
+    Orders can be objects or dicts with executed_at, qty (negative for sells) and price.
+    """
+    return fills_from_orders(order for trade in trades for order in _field(trade, "orders"))
+
+
+def open_position_fills(fills, orders, qty, entry_price, ts):
+    """
+    Fills of the position still open at the end of the run, fills_from_trades only has the completed trades.
+    The orders executed after the last of fills if they add up to qty,
+    otherwise a single fill of qty at entry_price at ts (eg. the position's opened_at) stands in for them.
+    """
+    since = fills[-1][0] if fills else -math.inf
+    executed = [f for f in fills_from_orders(orders) if f[0] > since]
+
+    if executed and math.isclose(sum(f[1] for f in executed), qty, rel_tol=1e-9, abs_tol=1e-12):
+        return executed
+    return [(ts, float(qty), float(entry_price))]
+
+
+def position_timeline(candle_ts, fills, initial_balance, fee_rate=0.0, size_scale=1.0, compound=True):
+    """
+    Position qty, avg. entry price and wallet balance at every candle close, rebuilt from fills.
+    A fill counts from the candle it was executed in. Adds average the entry price, reductions keep it
+    (realized pnl goes to the wallet), a flip opens the remainder at the fill price. Fees are charged per fill.
+    compound=False keeps the wallet at initial_balance (Strat.use_initial_balance).
+    The loop runs over fills only, candles are filled forward with NumPy.
+    """
+    candle_ts = np.asarray(candle_ts)
+    n = len(candle_ts)
+
+    qty, entry, wallet = 0.0, 0.0, float(initial_balance)
+    idx, qtys, entries, wallets = [], [], [], []
+
+    for ts, fill_qty, price in fills:
+        q = fill_qty * size_scale
+        if not q:
+            continue
+
+        if qty == 0 or (qty > 0) == (q > 0):
+            new_qty = qty + q
+            entry = (entry * abs(qty) + price * abs(q)) / abs(new_qty)
+        elif abs(q) <= abs(qty):
+            wallet += (price - entry) * -q
+            new_qty = qty + q
+        else:
+            wallet += (price - entry) * qty
+            new_qty = qty + q
+            entry = price
+
+        if abs(new_qty) < 1e-12:
+            new_qty, entry = 0.0, 0.0
+
+        wallet -= abs(q) * price * fee_rate
+        if not compound:
+            wallet = float(initial_balance)
+        qty = new_qty
+
+        idx.append(np.searchsorted(candle_ts, ts, side="right") - 1)
+        qtys.append(qty)
+        entries.append(entry)
+        wallets.append(wallet)
+
+    # State after the last fill of each candle, carried forward.
+    pos = np.searchsorted(np.asarray(idx, dtype=np.int64), np.arange(n), side="right") - 1
+    before = pos < 0
+    pos = np.maximum(pos, 0)
+
+    def column(values, initial):
+        if not values:
+            return np.full(n, float(initial))
+        return np.where(before, float(initial), np.asarray(values, dtype=float)[pos])
+
+    return column(qtys, 0.0), column(entries, 0.0), column(wallets, initial_balance)
+
+
+def starting_balance(fills, end_balance, fee_rate=0.0):
+    """Wallet balance before the fills that ends at end_balance after their realized pnl and fees."""
+    if not fills:
+        return float(end_balance)
+    _, _, wallet = position_timeline([fills[-1][0]], fills, 0.0, fee_rate)
+    return float(end_balance) - float(wallet[-1])
+
+
+def replay(
+    table,
+    candles,
+    fills,
+    initial_balance,
+    leverage=1,
+    fixed_margin_ratio=None,
+    fee_rate=0.0,
+    size_scale=1.0,
+    tmm1=0.0,
+    upnl1=0.0,
+    price_column=CLOSE,
+    compound=True,
+):
+    """
+    Risk metrics of a finished run for every candle: maintenance margin, margin ratio, LP1,
+    LP rate, udd and available margin, same formulas as the strategy (see risk.risk_surface, Strat.udd).
+    table is the route's TierTable (risk.tier_table), candles a Jesse candle array, fills (ts, signed qty, price).
+    Re-evaluate other settings by changing fixed_margin_ratio, leverage (available margin)
+    or size_scale (every fill scaled, eg. new leverage / old leverage for balance * leverage sizing).
+    tmm1/upnl1: other routes' maintenance margin and pnl, scalars or per candle arrays (see replay_routes).
+    price_column=ADVERSE evaluates every candle at its worst price for the position held at the close,
+    wicks a close based backtest misses (same as Strat.worst_case).
+    compound=False keeps the wallet balance at initial_balance, see position_timeline.
+    """
+    candles = np.asarray(candles, dtype=float)
+    ts = candles[:, TS]
+
+    qty, entry, wallet = position_timeline(ts, fills, initial_balance, fee_rate, size_scale, compound)
+
+    if price_column == ADVERSE:
+        prices = np.where(qty > 0, candles[:, LOW], np.where(qty < 0, candles[:, HIGH], candles[:, CLOSE]))
+    else:
+        prices = candles[:, price_column]
+    r = risk_surface(table, prices, qty, entry, wallet, tmm1, upnl1, fixed_margin_ratio)
+
+    is_open = qty != 0
+    pnl = r["pnl"]
+    lp1 = np.where(is_open, r["LP1"], np.nan)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lp_rate = np.where(qty > 0, lp1 / prices, prices / lp1)
+        udd = np.where(pnl < 0, pnl * 100 / (wallet + pnl), 0.0)
+
+    r.update(
+        {
+            "ts": ts.astype(np.int64),
+            "price": prices,
+            "qty": qty,
+            "entry_price": entry,
+            "wallet_balance": wallet,
+            "LP1": lp1,
+            "lp_rate": np.where(is_open, lp_rate, np.nan),
+            "udd": udd,
+            "avail_margin": r["margin_balance"] - r["position_value"] / leverage,
+        }
+    )
+    return r
+
+
+def replay_routes(routes, fixed_margin_ratio=None, price_column=CLOSE):
+    """
+    Replay several routes of one account, each route's tmm1/upnl1 come from the others.
+    routes: {symbol: dict(table=..., candles=..., fills=..., initial_balance=..., and optional replay kwargs)},
+    all routes must share the same candle timestamps.
+    Other routes are taken at the same candle, live the routes update one after another
+    so a route updated earlier sees the others' previous candle.
+    """
+    first = {}
+    for symbol, kw in routes.items():
+        first[symbol] = replay(**kw, fixed_margin_ratio=fixed_margin_ratio, price_column=price_column)
+
+    total_mm = sum(r["maintenance_margin"] for r in first.values())
+    total_pnl = sum(r["pnl"] for r in first.values())
+
+    return {
+        symbol: replay(
+            **kw,
+            fixed_margin_ratio=fixed_margin_ratio,
+            price_column=price_column,
+            tmm1=total_mm - first[symbol]["maintenance_margin"],
+            upnl1=total_pnl - first[symbol]["pnl"],
+        )
+        for symbol, kw in routes.items()
+    }
+
+
+def summary(r):
+    """Worst values of a replay, comparable with the strategy's running maxima."""
+    mr = r["margin_ratio"]
+    lpr = r["lp_rate"]
+    i_mr = int(np.nanargmax(mr)) if not np.isnan(mr).all() else None
+    i_lpr = int(np.nanargmax(lpr)) if np.isfinite(lpr).any() else None
+    i_udd = int(np.argmin(r["udd"])) if len(r["udd"]) else None
+
+    return {
+        "max_margin_ratio": float(mr[i_mr]) if i_mr is not None else 0.0,
+        "max_margin_ratio_ts": int(r["ts"][i_mr]) if i_mr is not None else None,
+        "max_lp_ratio": float(lpr[i_lpr]) if i_lpr is not None else float("nan"),
+        "max_lp_ratio_ts": int(r["ts"][i_lpr]) if i_lpr is not None else None,
+        "min_udd": float(r["udd"][i_udd]) if i_udd is not None else 0.0,
+        "min_udd_ts": int(r["ts"][i_udd]) if i_udd is not None else None,
+        "min_avail_margin": float(np.min(r["avail_margin"])) if len(r["avail_margin"]) else 0.0,
+    }
@@ -0,0 +1,246 @@
+import numpy as np
+
+from .brackets import TierTable, binance_store
+
+
+def tier_table(symbol, fixed_margin_ratio=None, bybit_risk_limits=None):
+    """
+    TierTable for a symbol (eg. BTC-USDT or BTCUSDT).
+    Binance brackets come from the shared store, pass bybit_risk_limits to use Bybit tiers instead.
+    """
+    if bybit_risk_limits is not None:
+        return TierTable.from_bybit(bybit_risk_limits, fixed_margin_ratio)
+
+    brackets = binance_store.get(symbol.replace("-", ""))
+    if brackets is None:
+        raise ValueError(f"No Binance tier brackets for {symbol}")
+    return TierTable.from_binance(brackets, fixed_margin_ratio)
+
+
+def tier_lookup(table, position_value):
+    """
+    Vectorized TierTable.lookup: maintenance margin rate, maintenance amount,
+    max. leverage and bracket number for every position value. Values above the last cap get the table's fallback.
+    """
+    position_value = np.asarray(position_value, dtype=float)
+
+    caps = np.asarray(table.caps, dtype=float)
+    idx = np.searchsorted(caps, position_value, side="right")
+    inside = idx < len(caps)
+    idx = np.minimum(idx, max(len(caps) - 1, 0))
+
+    def column(values, fallback):
+        if not len(caps):
+            return np.full(position_value.shape, float(fallback))
+        return np.where(inside, np.asarray(values, dtype=float)[idx], float(fallback))
+
+    mmr = column(table.mmrs, table.fallback["maintMarginRatio"])
+    cum = column(table.cums, table.fallback["maintAmount"])
+    leverage = column(table.leverages, table.fallback["initialLeverage"])
+    bracket = column(table.brackets, table.fallback["bracket"])
+    return mmr, cum, leverage, bracket
+
+
+def risk_surface(
+    table,
+    prices,
+    qty,
+    entry_prices,
+    wallet_balances,
+    tmm1=0.0,
+    upnl1=0.0,
+    fixed_margin_ratio=None,
+):
+    """
+    Maintenance margin, margin ratio and liquidation price (LP1) for a grid of scenarios.
+    Same formulas as Strat.maintenance_margin, Strat.margin_ratio and Strat.LP1 without the live state.
+    All inputs broadcast against each other.
+    qty is signed, positive for longs, negative for shorts.
+    tmm1/upnl1 are the maintenance margin and unrealized pnl of all other routes.
+    Returns a dict of arrays.
+    """
+    prices, qty, entry_prices, wallet_balances, tmm1, upnl1 = np.broadcast_arrays(
+        *(np.asarray(a, dtype=float) for a in (prices, qty, entry_prices, wallet_balances, tmm1, upnl1))
+    )
+
+    size = np.abs(qty)
+    side = np.where(qty < 0, -1.0, 1.0)
+    position_value = size * prices
+    pnl = (prices - entry_prices) * qty
+
+    # MMRB and cumB, fixed_margin_ratio is already applied to the table's tiers.
+    mmr, cum, leverage, bracket = tier_lookup(table, position_value)
+
+    if isinstance(fixed_margin_ratio, (float, int)):
+        maintenance_margin = position_value * fixed_margin_ratio - cum
+    else:
+        maintenance_margin = position_value * mmr - cum
+
+    margin_balance = wallet_balances + pnl + upnl1
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mr = np.round(maintenance_margin / margin_balance * 100, 2)
+        # We have MRs greater than 100% if we let it keep running.
+        mr = np.where(mr < 0, np.abs(mr) + 100, mr)
+
+        lp1 = (wallet_balances - tmm1 + upnl1 + cum - side * size * entry_prices) / (
+            size * mmr - side * size
+        )
+
+    lp1 = np.where(size > 0, lp1, np.nan)
+
+    return {
+        "position_value": position_value,
+        "pnl": pnl,
+        "bracket": bracket,
+        "maint_margin_rate": mmr,
+        "max_leverage": leverage,
+        "maintenance_margin": maintenance_margin,
+        "margin_balance": margin_balance,
+        "margin_ratio": mr,
+        "LP1": lp1,
+    }
+
+
+def risk_point(table, price, qty, entry_price, wallet_balance, tmm1=0.0, upnl1=0.0, fixed_margin_ratio=None):
+    """
+    risk_surface for a single scenario with plain floats and TierTable.lookup,
+    for per candle use where NumPy's call overhead would dominate. Returns a dict of floats.
+    """
+    size = abs(qty)
+    side = -1.0 if qty < 0 else 1.0
+    position_value = size * price
+    pnl = (price - entry_price) * qty
+
+    rl = table.lookup(position_value)
+    mmr, cum = rl["maintMarginRatio"], rl["maintAmount"]
+
+    if isinstance(fixed_margin_ratio, (float, int)):
+        maintenance_margin = position_value * fixed_margin_ratio - cum
+    else:
+        maintenance_margin = position_value * mmr - cum
+
+    margin_balance = wallet_balance + pnl + upnl1
+
+    try:
+        mr = round(maintenance_margin / margin_balance * 100, 2)
+        # We have MRs greater than 100% if we let it keep running.
+        mr = abs(mr) + 100 if mr < 0 else mr
+    except ZeroDivisionError:
+        mr = float("nan")
+
+    try:
+        lp1 = (wallet_balance - tmm1 + upnl1 + cum - side * size * entry_price) / (size * mmr - side * size)
+    except ZeroDivisionError:
+        lp1 = float("nan")
+
+    return {
+        "position_value": position_value,
+        "pnl": pnl,
+        "bracket": rl["bracket"],
+        "maint_margin_rate": mmr,
+        "max_leverage": rl["initialLeverage"],
+        "maintenance_margin": maintenance_margin,
+        "margin_balance": margin_balance,
+        "margin_ratio": mr,
+        "LP1": lp1 if size > 0 else float("nan"),
+    }
+
+
+def lp_rate(lp1, price, is_long):
+    """Liquidation price vs price rate, nan if it's undefined (eg. an LP1 of 0 on an over-collateralised short)."""
+    try:
+        return lp1 / price if is_long else price / lp1
+    except ZeroDivisionError:
+        return float("nan")
+
+
+def plan_ladder(
+    table,
+    base_price,
+    sizes,
+    deviations,
+    side,
+    wallet_balance,
+    leverage,
+    qty0=0.0,
+    entry0=0.0,
+    tmm1=0.0,
+    upnl1=0.0,
+    threshold=97,
+    fixed_margin_ratio=None,
+    quantizer=None,
+):
+    """
+    Plan a whole re-entry (DCA) ladder in one pass.
+    sizes: order size of each step in quote currency.
+    deviations: price deviation of each step from base_price as a fraction (eg. 0.02),
+    steps are placed below base_price for longs (side=1) and above for shorts (side=-1).
+    qty0/entry0: position that is already open before the first step.
+    quantizer: optional sizing.Quantizer, order quantities are snapped to the exchange filters
+    and orders below minQty/notional make their step infeasible.
+    Returns a dict of per step arrays (price, qty, avg. entry, bracket, max. leverage,
+    maintenance margin, margin ratio, LP1, available margin, feasible) and an overall ok flag.
+    A step is infeasible if the leverage exceeds its bracket, the margin ratio hits threshold,
+    available margin goes negative or the position would be liquidated before the next step.
+    """
+    sizes = np.asarray(sizes, dtype=float)
+    deviations = np.broadcast_to(np.asarray(deviations, dtype=float), sizes.shape)
+
+    prices = base_price * (1 - side * deviations)
+    order_qty = sizes / prices
+    below_min = np.zeros(sizes.shape, dtype=bool)
+
+    if quantizer is not None:
+        prices = quantizer.price(prices)
+        order_qty = quantizer.qty(sizes / prices)
+        sizes = order_qty * prices
+        below_min = ~quantizer.check(order_qty, prices)["valid"]
+
+    qty = np.abs(qty0) + np.cumsum(order_qty)
+    cost = np.abs(qty0) * entry0 + np.cumsum(sizes)
+    avg_entry = cost / qty
+
+    r = risk_surface(
+        table,
+        prices,
+        side * qty,
+        avg_entry,
+        wallet_balance,
+        tmm1,
+        upnl1,
+        fixed_margin_ratio,
+    )
+    avail_margin = r["margin_balance"] - r["position_value"] / leverage
+
+    lp1 = r["LP1"]
+    next_prices = np.append(prices[1:], np.nan)
+    if side > 0:
+        liquidated_before_next = lp1 >= next_prices
+    else:
+        liquidated_before_next = (lp1 > 0) & (lp1 <= next_prices)
+
+    feasible = (
+        (leverage <= r["max_leverage"])
+        & (r["margin_ratio"] < threshold)
+        & (avail_margin >= 0)
+        & ~liquidated_before_next
+        & ~below_min
+    )
+
+    r.update(
+        {
+            "step": np.arange(len(sizes)),
+            "price": prices,
+            "order_size": sizes,
+            "order_qty": order_qty,
+            "below_min": below_min,
+            "qty": qty,
+            "avg_entry": avg_entry,
+            "avail_margin": avail_margin,
+            "liquidated_before_next": liquidated_before_next,
+            "feasible": feasible,
+            "ok": bool(feasible.all()),
+        }
+    )
+    return r
@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+INDEX_VERSION = 1
+
+
+def index_fname(fname):
+    """BinancePerpetualFuturesExchangeInfo.json -> BinancePerpetualFuturesExchangeInfo.index.json"""
+    fname = Path(fname)
+    return fname.with_name(f"{fname.stem}.index.json")
+
+
+def compact_record(item):
+    """Keep only what the strategy needs, filters keyed by filterType instead of position."""
+    if "filters" in item:
+        return {
+            "symbol": item["symbol"],
+            "pricePrecision": item.get("pricePrecision"),
+            "quantityPrecision": item.get("quantityPrecision"),
+            "filters": {f["filterType"]: f for f in item["filters"]},
+        }
+    # Bybit records are already small.
+    return item
+
+
+class RulesIndex:
+    """
+    Exchange info file (Binance exchangeInfo or Bybit symbols) indexed by symbol.
+    Built once from the raw file and persisted next to it as *.index.json,
+    later loads read the small index as long as the raw file is unchanged.
+    """
+
+    def __init__(self, fname, symbols, source_mtime_ns, source_size):
+        self.fname = Path(fname)
+        self.symbols = symbols
+        self.source_mtime_ns = source_mtime_ns
+        self.source_size = source_size
+        self._found = {}
+
+    @classmethod
+    def build(cls, fname):
+        fname = Path(fname)
+        st = fname.stat()
+
+        with open(fname) as f:
+            data = json.load(f)
+
+        if "symbols" in data:
+            items, key = data["symbols"], "symbol"
+        else:
+            items, key = data["result"], "name"
+
+        symbols = {}
+        for item in items:
+            symbols.setdefault(item[key], compact_record(item))
+
+        index = cls(fname, symbols, st.st_mtime_ns, st.st_size)
+        index.save()
+        return index
+
+    @classmethod
+    def load(cls, fname):
+        """Load the persisted index if it matches the raw file, build it otherwise."""
+        fname = Path(fname)
+        st = fname.stat()
+
+        try:
+            with open(index_fname(fname)) as f:
+                data = json.load(f)
+            if (
+                data["version"] == INDEX_VERSION
+                and data["source_mtime_ns"] == st.st_mtime_ns
+                and data["source_size"] == st.st_size
+            ):
+                return cls(fname, data["symbols"], st.st_mtime_ns, st.st_size)
+        except Exception:
+            pass
+
+        return cls.build(fname)
+
+    def save(self):
+        data = {
+            "version": INDEX_VERSION,
+            "source": self.fname.name,
+            "source_mtime_ns": self.source_mtime_ns,
+            "source_size": self.source_size,
+            "symbols": self.symbols,
+        }
+
+        tmp = index_fname(self.fname).with_suffix(".tmp")
+        try:
+            with open(tmp, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, index_fname(self.fname))
+        except Exception as e:
+            print(f"Failed to save rules index for {self.fname}\n{e}")
+
+    def is_current(self):
+        try:
+            st = self.fname.stat()
+        except OSError:
+            return False
+        return st.st_mtime_ns == self.source_mtime_ns and st.st_size == self.source_size
+
+    def get(self, symbol):
+        return self.symbols.get(symbol)
+
+    def find(self, symbol):
+        """
+        First symbol in file order that equals or contains symbol, like the old linear scan.
+        Memoized, every route pays for the scan once at most.
+        """
+        try:
+            return self._found[symbol]
+        except KeyError:
+            pass
+
+        found = None
+        for name, record in self.symbols.items():
+            if name == symbol or symbol in name:
+                found = record
+                break
+
+        self._found[symbol] = found
+        return found
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def rules_index(fname):
+    """Process-wide RulesIndex of an exchange info file, re-read only when the file changes."""
+    key = str(Path(fname).resolve())
+
+    with _lock:
+        index = _indexes.get(key)
+        if index is None or not index.is_current():
+            index = _indexes[key] = RulesIndex.load(fname)
+        return index
+
+
+def is_expired(fname, ttl):
+    """True if the file is missing or older than ttl seconds."""
+    try:
+        return time.time() - os.path.getmtime(fname) > ttl
+    except OSError:
+        return True
@@ -0,0 +1,104 @@
+import math
+from decimal import Decimal
+from functools import lru_cache
+
+import numpy as np
+from jesse import utils
+
+
+@lru_cache(maxsize=1024)
+def min_order_size(price, min_qty, notional, step_size, precision, fee_rate):
+    """
+    Closed-form minimum order size for an exchange rule set, see Strat.min_order_size.
+    Returns qty, position size (quote), fees and True if the size is set by minQty.
+    Cached per rule set and price, candle prices are on the tick grid so they repeat.
+    """
+    # If USD value of minQTY is greater than minimum notional, use minQTY.
+    # Convert minQTY to dollar size and add potential fees before converting back to qty.
+    if min_qty * price >= notional:
+        cycle_pos_size = min_qty * price
+        fees = cycle_pos_size * fee_rate * 6
+        cycle_pos_size += fees
+        cycle_pos_size *= 1.05
+        qty = utils.size_to_qty(cycle_pos_size, price, precision=precision, fee_rate=fee_rate)
+        return qty, cycle_pos_size, fees, True
+
+    step_size = step_size or 10 ** -precision
+    fee_factor = 1 + fee_rate * 3
+    qty0 = utils.size_to_qty(notional, price, precision=precision, fee_rate=fee_rate)
+
+    def size_at(k):
+        cycle_pos_size = (qty0 + k * step_size) * price
+        return cycle_pos_size + cycle_pos_size * (fee_rate * 3)
+
+    # Smallest k >= 1 with (qty0 + k * stepSize) * price * (1 + 3 * fee_rate) > notional,
+    # same as stepping qty += stepSize until the notional is cleared.
+    k = max(1, math.floor((notional / (price * fee_factor) - qty0) / step_size) + 1)
+    while k > 1 and size_at(k - 1) > notional:
+        k -= 1
+    while size_at(k) <= notional:
+        k += 1
+
+    cycle_pos_size = size_at(k)
+    fees = cycle_pos_size * (fee_rate * 6)
+    cycle_pos_size += fees
+    cycle_pos_size *= 1.05
+
+    qty = utils.size_to_qty(cycle_pos_size, price, precision=precision, fee_rate=fee_rate)
+    return qty, cycle_pos_size, fees, False
+
+
+def decimals(step, precision):
+    """Decimals needed for a step size (eg. 0.025 -> 3), at least precision."""
+    return max(precision, -Decimal(str(step)).normalize().as_tuple().exponent, 0)
+
+
+class Quantizer:
+    """
+    Exchange filters of one symbol precompiled for batch sizing.
+    Steps are kept as integer multiples of the smallest decimal unit,
+    so whole NumPy arrays are snapped with integer math and no per value string/decimal lookups.
+    """
+
+    def __init__(self, step_size, quantity_precision, price_precision, min_qty, notional, tick_size=None):
+        self.step_size = step_size
+        self.min_qty = min_qty
+        self.notional = notional
+        self.price_precision = price_precision
+        self.tick_size = tick_size or 10 ** -price_precision
+
+        # eg. stepSize 0.025 -> 3 decimals, step of 25 units
+        self.qty_scale = 10 ** decimals(step_size, quantity_precision)
+        self.qty_step_units = max(int(round(step_size * self.qty_scale)), 1)
+        # eg. tickSize 0.10 with pricePrecision 2 -> tick of 10 units
+        self.price_scale = 10 ** decimals(self.tick_size, price_precision)
+        self.price_tick_units = max(int(round(self.tick_size * self.price_scale)), 1)
+
+    def qty(self, qty):
+        """Floor quantities to a valid multiple of stepSize (sign is kept)."""
+        qty = np.asarray(qty, dtype=float)
+        units = np.floor(np.abs(qty) * self.qty_scale / self.qty_step_units + 1e-9)
+        return np.sign(qty) * units * self.qty_step_units / self.qty_scale
+
+    def price(self, prices):
+        """Round prices to the nearest multiple of tickSize."""
+        units = np.round(np.asarray(prices, dtype=float) * self.price_scale / self.price_tick_units)
+        return units * self.price_tick_units / self.price_scale
+
+    def size_to_qty(self, sizes, prices, fee_rate=0):
+        """Batch version of utils.size_to_qty snapped to stepSize."""
+        sizes = np.asarray(sizes, dtype=float)
+        if fee_rate != 0:
+            sizes = sizes * (1 - fee_rate * 3)
+        return self.qty(sizes / np.asarray(prices, dtype=float))
+
+    def check(self, qty, prices):
+        """Masks of entries below minQty or the minimum notional."""
+        qty = np.abs(np.asarray(qty, dtype=float))
+        below_min_qty = qty < self.min_qty
+        below_notional = qty * np.asarray(prices, dtype=float) < self.notional
+        return {
+            "below_min_qty": below_min_qty,
+            "below_notional": below_notional,
+            "valid": ~(below_min_qty | below_notional),
+        }
@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "benchmarks"))
+sys.path.insert(0, str(ROOT))
+
+# Strat is driven on the benchmark's Jesse stand-in, see benchmarks/jesse_standin.py
+import jesse_standin  # noqa: E402
+
+jesse_standin.install()
+
+from bench_strat import EXCHANGES, write_exchange_files  # noqa: E402
+
+TIMEFRAME = 300000
+
+
+def set_price(route, price):
+    """Append a flat candle at price, a new candle invalidates the candle scoped caches."""
+    ts = route.candles[-1][0] + TIMEFRAME
+    route.candles = [route.candles[-1], [ts, price, price, price, price, 1]]
+
+
+@pytest.fixture
+def make_routes(tmp_path, monkeypatch):
+    """make_routes(symbols, exchange) -> Strat routes sharing shared_vars, after run_once."""
+    monkeypatch.chdir(tmp_path)
+    import strat
+
+    class TestStrat(strat.Strat):
+        div = 1
+        cycle_pos_size = 0
+        max_cycle_entry_recorded = 0
+        total_positions = 0
+        last_trade_ts = 0
+
+    def make(symbols=("BTC",), exchange="binance", prices=(20000.0, 1500.0, 300.0), leverage=5):
+        write_exchange_files([f"{s}USDT" for s in symbols])
+        jesse_standin.Strategy.ROUTES = [(EXCHANGES[exchange], f"{s}-USDT") for s in symbols]
+        jesse_standin.Strategy.SHARED_VARS = {}
+
+        routes = []
+        for symbol, price in zip(symbols, prices):
+            route = TestStrat()
+            route.exchange = EXCHANGES[exchange]
+            route.symbol = f"{symbol}-USDT"
+            route.leverage = leverage
+            route.candles = [[0, price, price, price, price, 1], [TIMEFRAME, price, price, price, price, 1]]
+            routes.append(route)
+        for route in routes:
+            route.run_once()
+        return routes
+
+    return make
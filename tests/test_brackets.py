@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from strat.brackets import BinaryBrackets, binance_store, convert_brackets
+
+BRACKETS = [{"bracket": 1, "initialLeverage": 20, "notionalCap": 5000, "notionalFloor": 0,
+             "maintMarginRatio": 0.025, "cum": 0.0}]
+
+
+def test_binary_matches_bundled_json():
+    binary = BinaryBrackets.open(binance_store.bin_fname, binance_store.fname)
+    assert binary, "bundled .bin is missing or stale, run python -m strat.brackets"
+
+    data = json.load(open(binance_store.fname))
+    first = {}
+    for i in data:
+        first.setdefault(i["symbol"], i["brackets"])
+    assert set(binary.index) == set(first)
+    for symbol, brackets in first.items():
+        assert binary.get(symbol) == [{k: b[k] for k in BRACKETS[0]} for b in brackets]
+
+
+def test_long_symbols_are_rejected(tmp_path):
+    src = tmp_path / "brackets.json"
+    src.write_text(json.dumps([
+        {"symbol": "1000000SHIBUSDT_PERP", "brackets": BRACKETS},
+        {"symbol": "1000000SHIBUSDT_QTR", "brackets": BRACKETS},
+    ]))
+    with pytest.raises(ValueError, match="longer than 16 bytes"):
+        convert_brackets(src)
+    assert not (tmp_path / "brackets.bin").exists()
+
+
+def test_sixteen_byte_symbols_round_trip(tmp_path):
+    src = tmp_path / "brackets.json"
+    src.write_text(json.dumps([{"symbol": "ABCDEFGHIJKLUSDT", "brackets": BRACKETS}]))
+    binary = BinaryBrackets(convert_brackets(src))
+    assert binary.get("ABCDEFGHIJKLUSDT")[0]["maintMarginRatio"] == 0.025
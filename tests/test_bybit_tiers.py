@@ -0,0 +1,136 @@
+import json
+
+import pytest
+
+from strat import brackets
+from strat.brackets import BybitRiskStore, extend_bybit_tiers, normalize_bybit_tier
+
+BASE = [
+    {"id": 1, "symbol": "BTCUSDT", "limit": 2000000.0, "maintain_margin": 0.005, "starting_margin": 0.01,
+     "is_lowest_risk": 1, "max_leverage": 100.0},
+    {"id": 2, "symbol": "BTCUSDT", "limit": 4000000.0, "maintain_margin": 0.01, "starting_margin": 0.0175,
+     "is_lowest_risk": 0, "max_leverage": 57.14},
+]
+
+
+def test_normalize_v5_item():
+    item = {"id": 3, "symbol": "ETHUSDT", "riskLimitValue": "900000", "maintenanceMargin": "0.01",
+            "initialMargin": "0.02", "isLowestRisk": 0, "maxLeverage": "50.00", "mmDeduction": ""}
+    assert normalize_bybit_tier(item) == {
+        "id": 3, "symbol": "ETHUSDT", "limit": 900000.0, "maintain_margin": 0.01,
+        "starting_margin": 0.02, "is_lowest_risk": 0, "max_leverage": 50.0,
+    }
+
+
+def test_extend_follows_the_incremental_formula():
+    tiers = extend_bybit_tiers(BASE)
+    added = tiers[2:]
+
+    # IM 1.75% + n * 0.75% reaches 100% after 131 steps, the last tier is 1x leverage.
+    assert len(added) == 131
+    assert added[-1]["starting_margin"] == 1.0
+    assert added[-1]["max_leverage"] == 1.0
+    assert all(t["incremental"] for t in added)
+
+    for n, t in enumerate(added, 1):
+        assert t["limit"] == 4000000.0 + n * 2000000.0
+        assert t["maintain_margin"] == pytest.approx(min(0.01 + n * 0.005, 1.0))
+        assert t["id"] == 2 + n
+
+
+def test_extend_is_idempotent_and_capped():
+    tiers = extend_bybit_tiers(BASE)
+    assert extend_bybit_tiers(tiers) == tiers
+    assert len(extend_bybit_tiers(BASE, max_tiers=5)) == 7
+
+
+def test_extend_leaves_flat_or_short_lists():
+    assert extend_bybit_tiers(BASE[:1]) == BASE[:1]
+    flat = [dict(BASE[0]), dict(BASE[1], maintain_margin=0.005, starting_margin=0.01)]
+    assert extend_bybit_tiers(flat) == flat
+
+
+def test_store_prefers_legacy_file_over_download(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "bybit").mkdir()
+    legacy = tmp_path / "bybit" / "risk-limit-BTC-USDT.json"
+    legacy.write_text(json.dumps({"result": BASE}))
+
+    store = BybitRiskStore(tmp_path / "bybit" / "risk-limits.json")
+
+    def offline():
+        raise AssertionError("downloaded although the legacy file exists")
+
+    monkeypatch.setattr(store, "refresh", offline)
+
+    tiers = store.get("BTCUSDT", legacy_fname=str(legacy))
+    assert tiers == extend_bybit_tiers(BASE)
+
+    # Migrated into the consolidated store.
+    assert BybitRiskStore(store.fname).load()["BTCUSDT"] == tiers
+
+
+def test_store_downloads_missing_symbols_once(tmp_path, monkeypatch):
+    pages = [
+        {"retCode": 0, "result": {"list": [
+            {"id": 2, "symbol": "BTCUSDT", "riskLimitValue": "4000000", "maintenanceMargin": "0.01",
+             "initialMargin": "0.0175", "isLowestRisk": 0, "maxLeverage": "57.14"}], "nextPageCursor": "p2"}},
+        {"retCode": 0, "result": {"list": [
+            {"id": 1, "symbol": "BTCUSDT", "riskLimitValue": "2000000", "maintenanceMargin": "0.005",
+             "initialMargin": "0.01", "isLowestRisk": 1, "maxLeverage": "100"}], "nextPageCursor": ""}},
+    ]
+    calls = []
+
+    def get_json(url, **kwargs):
+        calls.append(url)
+        return pages[len(calls) - 1]
+
+    from strat import downloads
+
+    monkeypatch.setattr(downloads.downloader, "get_json", get_json)
+    store = BybitRiskStore(tmp_path / "risk-limits.json")
+
+    tiers = store.get("BTCUSDT")
+    assert [t["limit"] for t in tiers] == [2000000.0, 4000000.0]
+    assert calls[1].endswith("&cursor=p2")
+    assert store.get("BTCUSDT") is tiers
+    assert len(calls) == 2
+    assert brackets.TierTable.from_bybit(tiers).lookup(3000000.0)["maintMarginRatio"] == 0.01
+
+
+def test_store_refreshes_unknown_symbols_once_per_ttl(tmp_path, monkeypatch):
+    store = BybitRiskStore(tmp_path / "risk-limits.json")
+    refreshes = []
+
+    def refresh():
+        refreshes.append(1)
+        store.refreshed_at = now[0]
+        store.by_symbol = {"BTCUSDT": BASE}
+
+    now = [1000.0]
+    monkeypatch.setattr(brackets.time, "time", lambda: now[0])
+    monkeypatch.setattr(store, "refresh", refresh)
+
+    assert store.get("XYZUSDT") is None
+    assert store.get("XYZUSDT") is None
+    assert store.get("ABCUSDT") is None
+    assert len(refreshes) == 1
+
+    now[0] += store.refresh_ttl + 1
+    assert store.get("XYZUSDT") is None
+    assert len(refreshes) == 2
+
+
+def test_store_does_not_hide_a_corrupt_file(tmp_path):
+    fname = tmp_path / "risk-limits.json"
+    fname.write_text("{not json")
+    store = BybitRiskStore(fname)
+
+    with pytest.raises(ValueError, match="risk-limits.json"):
+        store.load()
+    assert store.by_symbol is None
+
+
+def test_v5_tiers_fall_back_to_the_last_tier():
+    table = brackets.TierTable.from_bybit(BASE)
+    assert table.lookup(1e12)["maintMarginRatio"] == 0.01
@@ -0,0 +1,36 @@
+import pytest
+
+from conftest import set_price
+from strat.cache import candle_cached
+
+
+def test_rejects_methods_with_arguments():
+    with pytest.raises(TypeError):
+
+        @candle_cached
+        def margin_ratio(self, caller=None):
+            return 0
+
+
+@pytest.mark.parametrize("debug", [False, True])
+def test_debug_mode_does_not_repeat_side_effects(make_routes, debug):
+    (btc,) = make_routes(("BTC",))
+    btc.metric_cache_debug = debug
+    btc.keep_running_in_case_of_liquidation = True
+    btc.margin_ratio_treshold = 1
+    btc.position.qty = 5.0
+    btc.position.entry_price = 20000.0
+    set_price(btc, 19000.0)
+
+    checks = []
+    check_liquidation = btc.check_liquidation
+    btc.check_liquidation = lambda mr, caller=None: (checks.append(caller), check_liquidation(mr, caller))
+
+    values = [btc.margin_ratio(caller) for caller in ("a", "b", "b")]
+    rates = [btc.lp_rate() for _ in range(3)]
+
+    # One check per call, like an uncached margin_ratio, none from the debug recomputation.
+    assert checks == ["a", "b", "b"]
+    assert len(set(values)) == 1 and values[0] >= btc.margin_ratio_treshold
+    assert len(set(rates)) == 1
+    assert btc.shared_vars["max_lp_ratio"] == rates[0]
@@ -0,0 +1,125 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from strat.downloads import Downloader, meta_fname
+
+ETAG = '"v1"'
+BODY = {"serverTime": 1, "symbols": ["BTCUSDT"]}
+
+
+class Handler(BaseHTTPRequestHandler):
+    requests = []
+    delay = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        Handler.requests.append((self.command, self.path, self.headers.get("If-None-Match")))
+        time.sleep(Handler.delay)
+
+        if self.path == "/busy":
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body = json.dumps(BODY).encode()
+        self.send_response(200)
+        self.send_header("ETag", ETAG)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        Handler.requests.append((self.command, self.path, None))
+        self.send_response(503)
+        self.end_headers()
+
+
+@pytest.fixture
+def server():
+    Handler.requests = []
+    Handler.delay = 0.0
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def saver(local_fn, ok=True):
+    def save(data):
+        if not ok:
+            return False
+        with open(local_fn, "w") as f:
+            json.dump(data, f)
+        return True
+
+    return save
+
+
+def test_conditional_get_uses_etag(server, tmp_path):
+    d = Downloader(retries=0)
+    local_fn = str(tmp_path / "rules.json")
+
+    assert d.get_json_if_modified(f"{server}/rules", local_fn, saver(local_fn)) == BODY
+    assert json.load(open(meta_fname(local_fn)))["etag"] == ETAG
+
+    os.utime(local_fn, (0, 0))
+    assert d.get_json_if_modified(f"{server}/rules", local_fn, saver(local_fn)) is None
+    assert os.path.getmtime(local_fn) > 0
+    assert [r[2] for r in Handler.requests] == [None, ETAG]
+
+
+def test_failed_save_keeps_requests_unconditional(server, tmp_path):
+    d = Downloader(retries=0)
+    local_fn = str(tmp_path / "rules.json")
+    open(local_fn, "w").write("stale")
+
+    assert d.get_json_if_modified(f"{server}/rules", local_fn, saver(local_fn, ok=False)) == BODY
+    assert not os.path.exists(meta_fname(local_fn))
+
+    # Still a full download, not a 304 for the stale file.
+    assert d.get_json_if_modified(f"{server}/rules", local_fn, saver(local_fn)) == BODY
+    assert [r[2] for r in Handler.requests] == [None, None]
+    assert json.load(open(local_fn)) == BODY
+
+
+def test_concurrent_requests_share_one_download(server):
+    d = Downloader(retries=0)
+    Handler.delay = 0.3
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(d.get_json(f"{server}/rules"))) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [BODY] * 6
+    assert len(Handler.requests) == 1
+
+
+def test_only_idempotent_requests_are_retried(server):
+    d = Downloader(retries=2, backoff=0)
+
+    with pytest.raises(requests.exceptions.RetryError):
+        d.get(f"{server}/busy")
+    assert len(Handler.requests) == 3
+
+    Handler.requests.clear()
+    assert d.post(f"{server}/busy").status_code == 503
+    assert len(Handler.requests) == 1
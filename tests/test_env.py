@@ -0,0 +1,31 @@
+from strat import env
+
+
+def test_timeframe_ms_comes_from_the_timeframe(make_routes):
+    (btc,) = make_routes(("BTC",))
+    btc.timeframe = "15m"
+    btc._timeframe_ms = None
+
+    # A gap in the data doesn't change the candle length.
+    btc.candles = [[0, 1, 1, 1, 1, 1], [3 * 900000, 1, 1, 1, 1, 1]]
+    assert btc.timeframe_ms == 900000
+    assert btc.now == 3 * 900000 + 900000
+
+
+def test_unknown_timeframe_is_measured(make_routes):
+    (btc,) = make_routes(("BTC",))
+    btc.timeframe = "7m"
+    btc._timeframe_ms = None
+
+    btc.candles = [[0, 1, 1, 1, 1, 1], [420000, 1, 1, 1, 1, 1]]
+    assert btc.timeframe_ms == 420000
+    btc.candles = [[0, 1, 1, 1, 1, 1]]
+    assert btc.timeframe_ms == 300000
+    btc.candles = None
+    assert btc.timeframe_ms == 300000
+
+
+def test_timeframe_table():
+    assert env.TIMEFRAME_MS["1m"] == 60000
+    assert env.TIMEFRAME_MS["4h"] == 4 * 60 * 60 * 1000
+    assert env.TIMEFRAME_MS["1D"] == 24 * 60 * 60 * 1000
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from strat import logs
+
+
+def test_sink_without_write_fails_on_creation():
+    class NoWrite(logs.Sink):
+        pass
+
+    with pytest.raises(TypeError):
+        NoWrite()
+
+
+def test_buffered_sink_without_write_fails_on_creation():
+    class NoWrite(logs.BufferedSink):
+        pass
+
+    with pytest.raises(TypeError):
+        NoWrite()
+    assert not any(isinstance(sink, NoWrite) for sink in logs.flusher.sinks)
+
+
+def test_ring_buffer_sink():
+    sink = logs.RingBufferSink(capacity=2)
+    logger = logs.Logger(lambda: (1, "BTC"), [sink])
+    for i in range(3):
+        logger.info(f"line {i}")
+    assert sink.lines() == ["1 BTC line 1", "1 BTC line 2"]
+
+
+def test_file_sink_rejects_other_settings(tmp_path):
+    path = tmp_path / "strat.log"
+    sink = logs.file_sink(path, level=logs.INFO)
+    try:
+        assert logs.file_sink(path, level=logs.INFO) is sink
+        with pytest.raises(ValueError, match="already open"):
+            logs.file_sink(path, level=logs.DEBUG)
+    finally:
+        sink.close()
+        logs._file_sinks.clear()
+
+
+def test_writers_dont_wait_for_the_io(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    written = []
+
+    class SlowSink(logs.BufferedSink):
+        def _write(self, texts):
+            started.set()
+            release.wait(5)
+            written.extend(texts)
+
+    sink = SlowSink()
+    try:
+        sink.write_text("a\n")
+        flushing = threading.Thread(target=sink.flush)
+        flushing.start()
+        assert started.wait(5)
+
+        # The flush is blocked in _write, buffering still works.
+        t = time.perf_counter()
+        sink.write_text("b\n")
+        assert time.perf_counter() - t < 1
+        release.set()
+        flushing.join(5)
+        sink.flush()
+        assert written == ["a\n", "b\n"]
+    finally:
+        release.set()
+        logs.flusher.unregister(sink)
+
+
+def test_console_print_flushes_buffered_output_first(monkeypatch, capsys):
+    stream = logs.StreamSink()
+    monkeypatch.setattr(logs, "_stdout_sink", stream)
+    try:
+        stream.write_text("buffered\n")
+        logs.console_print("direct")
+        assert capsys.readouterr().out == "buffered\ndirect\n"
+    finally:
+        logs.flusher.unregister(stream)
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from conftest import set_price
+
+
+def open_position(route, qty, price):
+    route.position.qty = qty
+    route.position.entry_price = price
+
+
+@pytest.mark.parametrize("exchange", ["binance", "bybit"])
+@pytest.mark.parametrize("side", [1, -1])
+def test_margin_check_matches_margin_ratio_sweep(make_routes, exchange, side):
+    btc, eth = make_routes(("BTC", "ETH"), exchange)
+    for route in (btc, eth):
+        route.keep_running_in_case_of_liquidation = True
+        route.margin_ratio_treshold = 30
+
+    full_calls = []
+    margin_ratio = btc.margin_ratio
+
+    def counted(caller=None):
+        full_calls.append(caller)
+        return margin_ratio(caller)
+
+    btc.margin_ratio = counted
+
+    for qty, balance in ((2.0, 10000.0), (15.0, 60000.0), (120.0, 1e6)):
+        btc.balance = eth.balance = balance
+        open_position(btc, side * qty, 20000.0)
+        open_position(eth, -side * qty * 5, 1500.0)
+
+        # Other route's pnl changes every step, it shifts the trigger prices of btc.
+        for i, f in enumerate(np.geomspace(0.55, 1.6, 400)):
+            set_price(eth, 1500.0 * (1 + 0.05 * np.sin(i / 7)))
+            eth.update_shared_vars("sweep")
+            set_price(btc, 20000.0 * f)
+            btc.update_shared_vars("sweep")
+            mr = btc.shared_vars["margin_ratio"]
+
+            btc._metric_cache_key = None
+            brute = margin_ratio("brute")
+            assert mr == pytest.approx(brute, abs=0.011)
+            assert (mr >= btc.margin_ratio_treshold) == (brute >= btc.margin_ratio_treshold)
+
+    # The full margin ratio only runs near a trigger price or above the threshold.
+    assert len(full_calls) < 0.4 * 3 * 400
+
+
+def test_margin_band_ignores_other_routes_pnl(make_routes):
+    btc, eth = make_routes(("BTC", "ETH"))
+    open_position(btc, 1.0, 20000.0)
+    open_position(eth, 10.0, 1500.0)
+    band = btc.margin_band
+
+    for price in (1400.0, 1450.0, 1600.0):
+        set_price(eth, price)
+        eth.update_shared_vars("t")
+        set_price(btc, 20100.0)
+        assert btc.margin_band is band
+
+
+def test_margin_check_leaves_the_alert_of_other_routes(make_routes):
+    btc, eth = make_routes(("BTC", "ETH"))
+    open_position(btc, 1.0, 20000.0)
+    eth.check_mr_alert(eth.margin_ratio_treshold, "t")
+    assert btc.shared_vars["margin_alert"] == "True"
+
+    set_price(btc, 20100.0)
+    btc.update_shared_vars("t")
+    assert not btc.margin_threshold_reached("t")
+    assert btc.shared_vars["margin_alert"] == "True"
+    assert btc.check_global_margin_alert("t")
@@ -0,0 +1,20 @@
+from strat import notify
+
+
+def test_close_at_exit_reports_undelivered(monkeypatch, capsys):
+    timeouts = []
+
+    def close(timeout):
+        timeouts.append(timeout)
+        return False
+
+    monkeypatch.setattr(notify.dispatcher, "close", close)
+    notify.close_at_exit()
+    assert timeouts == [2]
+    assert "Not all notifications were delivered" in capsys.readouterr().out
+
+
+def test_chunk_lines_respects_the_limit():
+    chunks = notify.chunk_lines(["a" * 5, "b" * 3, "c" * 12], limit=10)
+    assert chunks == ["aaaaa\nbbb", "c" * 10, "cc"]
+    assert all(len(c) <= 10 for c in chunks)
@@ -0,0 +1,108 @@
+import json
+import math
+
+import pytest
+
+from conftest import set_price
+from strat.portfolio import Portfolio
+
+
+def test_route_state_reads_like_the_old_dict():
+    p = Portfolio()
+    state = p.route("BTC-USDT")
+    state.active, state.is_open, state.pos_value, state.pnl = True, True, 1000.1234567, -12.5
+
+    assert state["active"] == "True"
+    assert state["pos_value"] == 1000.123457
+    assert dict(state)["pnl"] == -12.5
+    assert json.loads(json.dumps({"BTC-USDT": state}, default=dict))["BTC-USDT"]["is_open"] == "True"
+
+
+def test_route_state_writes_through():
+    p = Portfolio()
+    btc, eth = p.route("BTC-USDT"), p.route("ETH-USDT")
+    btc["is_open"] = eth["is_open"] = "True"
+
+    btc["pnl"] = 10.0
+    eth["pnl"] = -4.0
+    btc["maintenance_margin"] = 50.0
+    assert p.total("pnl") == 6.0
+    assert p.others("pnl", "BTC-USDT") == -4.0
+    assert p.total("maintenance_margin") == 50.0
+
+    btc["active"] = "False"
+    assert btc.active is False
+    btc["my_flag"] = {"x": 1}
+    assert btc["my_flag"] == {"x": 1} and "my_flag" in dict(btc)
+    del btc["my_flag"]
+    assert "my_flag" not in btc
+
+    with pytest.raises(KeyError):
+        del btc["pnl"]
+
+
+def test_strategy_writes_to_shared_vars(make_routes):
+    btc, eth = make_routes(("BTC", "ETH"))
+    for route in (btc, eth):
+        set_price(route, route.close)
+        route.update_shared_vars("t")
+
+    btc.shared_vars["BTC-USDT"]["entries"] = 3
+    btc.shared_vars["ETH-USDT"]["pnl"] = 25.0
+    assert btc.shared_vars["BTC-USDT"]["entries"] == 3
+    assert btc.UPNL1 == 25.0
+
+
+def test_retain_drops_other_routes():
+    p = Portfolio()
+    for symbol, pnl in (("BTC-USDT", 10.0), ("ETH-USDT", -4.0), ("SOL-USDT", 100.0)):
+        p.route(symbol)
+        p.publish(symbol, 1.0, pnl, 50.0)
+
+    p.retain(["BTC-USDT", "ETH-USDT"])
+    assert p.total("pnl") == 6.0
+    assert p.total("maintenance_margin") == 2.0
+    assert p["routes"] == 2
+    assert "SOL-USDT" not in p.states
+
+
+def test_no_state_leaks_into_the_next_run(make_routes):
+    # First run trades SOL at a loss and leaves it in the shared portfolio.
+    btc, eth, sol = make_routes(("BTC", "ETH", "SOL"))
+    sol.position.qty, sol.position.entry_price = 10.0, 300.0
+    set_price(sol, 200.0)
+    sol.update_shared_vars("t")
+    assert btc.UPNL1 == -1000.0
+    shared_vars = btc.shared_vars
+
+    # Next run in the same process on the same shared_vars, without SOL.
+    import jesse_standin
+
+    jesse_standin.Strategy.SHARED_VARS = shared_vars
+    jesse_standin.Strategy.ROUTES = [(btc.exchange, "BTC-USDT"), (eth.exchange, "ETH-USDT")]
+    btc2, eth2 = type(btc)(), type(eth)()
+    for route, old in ((btc2, btc), (eth2, eth)):
+        route.exchange, route.symbol, route.candles = old.exchange, old.symbol, list(old.candles)
+    btc2.run_once()
+    eth2.run_once()
+
+    assert btc2.UPNL1 == 0.0
+    assert btc2.TMM1 == 0.0
+    assert btc2.portfolio["routes"] == 2
+
+
+def test_non_finite_values_propagate():
+    p = Portfolio()
+    p.publish("BTC-USDT", 10.0, 1.0, 100.0)
+    p.publish("ETH-USDT", float("nan"), 2.0, float("inf"))
+
+    assert math.isnan(p.total("maintenance_margin"))
+    assert math.isnan(p.others("maintenance_margin", "BTC-USDT"))
+    assert p.others("maintenance_margin", "ETH-USDT") == 10.0
+    assert p.total("pnl") == 3.0
+    assert p.total("pos_value") == math.inf
+    assert math.isnan(p["maintenance_margin"])
+
+    p.publish("ETH-USDT", 5.0, 2.0, 50.0)
+    assert p.total("maintenance_margin") == 15.0
+    assert p.total("pos_value") == 150.0
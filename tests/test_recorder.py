@@ -0,0 +1,37 @@
+import numpy as np
+
+from strat.recorder import MetricRecorder
+
+
+def row(ts, price):
+    return (ts, price, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0)
+
+
+def test_same_candle_overwrites_the_last_row():
+    rec = MetricRecorder(capacity=2)
+    for ts, price in ((0, 1.0), (0, 1.5), (1, 2.0), (2, 3.0), (2, 3.5), (3, 4.0)):
+        rec.append(*row(ts, price))
+
+    a = rec.arrays()
+    assert a["ts"].tolist() == [0, 1, 2, 3]
+    assert a["price"].tolist() == [1.5, 2.0, 3.5, 4.0]
+
+
+def test_ring_buffer_overwrites_the_newest_row():
+    rec = MetricRecorder(capacity=2, max_rows=3)
+    for ts in range(5):
+        rec.append(*row(ts, float(ts)))
+    rec.append(*row(4, 9.0))
+
+    a = rec.arrays()
+    assert rec.total == 5
+    assert a["ts"].tolist() == [2, 3, 4]
+    assert np.array_equal(a["price"], [2.0, 3.0, 9.0])
+
+
+def test_update_shared_vars_records_one_row_per_candle(make_routes):
+    (btc,) = make_routes(("BTC",))
+    btc.record_metrics = True
+    btc.update_shared_vars("first")
+    btc.update_shared_vars("second")
+    assert btc.metric_recorder.size == 1
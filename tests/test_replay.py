@@ -0,0 +1,85 @@
+import math
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from conftest import TIMEFRAME
+from strat import replay
+
+
+def order(ts, qty, price):
+    return SimpleNamespace(executed_at=ts, qty=qty, price=price)
+
+
+def run(route, prices, entries):
+    """Feed close prices, entries {candle index: qty} fill at that candle's close into orders."""
+    candles = list(route.candles)
+    for i, price in enumerate(prices):
+        ts = candles[-1][0] + TIMEFRAME
+        candles.append([ts, price, price, price * 1.002, price * 0.998, 1])
+        route.candles = candles[-2:]
+        if i in entries:
+            qty = entries[i]
+            old = route.position.qty
+            entry = route.position.entry_price or 0.0
+            route.position.entry_price = (entry * abs(old) + price * abs(qty)) / abs(old + qty)
+            route.position.qty = old + qty
+            route.orders.append(order(ts, qty, price))
+        route.update_shared_vars("test")
+    return np.array(candles)
+
+
+@pytest.mark.parametrize("side", [1, -1])
+@pytest.mark.parametrize("use_initial_balance", [False, True])
+def test_open_position_is_replayed(make_routes, side, use_initial_balance):
+    (btc,) = make_routes(("BTC",))
+    btc.use_initial_balance = use_initial_balance
+    btc.balance = 12000.0  # Live balance moved away from the initial balance.
+    prices = 20000.0 * (1 - side * 0.002 * np.arange(40))
+    candles = run(btc, prices, {5: side * 1.5, 20: side * 1.0})
+
+    r = btc.risk_replay(candles=candles)
+    assert r["qty"][-1] == pytest.approx(btc.position.qty)
+    assert r["entry_price"][-1] == pytest.approx(btc.avgEntryPrice)
+    assert r["wallet_balance"][-1] == pytest.approx(btc.cap)
+    assert r["margin_ratio"][-1] == pytest.approx(btc.margin_ratio(), abs=0.01)
+    assert r["LP1"][-1] == pytest.approx(btc.LP1)
+    # Both entries are in, the position grows at the second one.
+    assert r["qty"][7] == pytest.approx(side * 1.5)
+
+
+def test_open_position_without_orders(make_routes):
+    (btc,) = make_routes(("BTC",))
+    candles = run(btc, [20000.0] * 10, {3: 2.0})
+    btc.orders = []
+
+    fills = btc.replay_fills()
+    assert fills == [(btc.current_candle[0], 2.0, 20000.0)]
+    r = btc.risk_replay(candles=candles)
+    assert r["LP1"][-1] == pytest.approx(btc.LP1)
+
+
+def test_open_position_fills_after_completed_trades():
+    closed = [(1, 1.0, 100.0), (5, -1.0, 110.0)]
+    orders = [order(ts, qty, price) for ts, qty, price in closed] + [order(7, -2.0, 105.0)]
+    assert replay.open_position_fills(closed, orders, -2.0, 105.0, 9) == [(7, -2.0, 105.0)]
+    # Orders that don't add up to the position are replaced by a single fill.
+    assert replay.open_position_fills(closed, orders, -3.0, 104.0, 9) == [(9, -3.0, 104.0)]
+
+
+def test_starting_balance():
+    fills = [(1, 1.0, 100.0), (5, -1.0, 110.0)]
+    start = replay.starting_balance(fills, 1000.0, fee_rate=0.001)
+    assert math.isclose(start, 1000.0 - 10.0 + 0.21)
+    _, _, wallet = replay.position_timeline([5], fills, start, fee_rate=0.001)
+    assert math.isclose(wallet[-1], 1000.0)
+
+
+def test_summary_without_a_margin_ratio():
+    nan = np.full(3, np.nan)
+    r = {"ts": np.arange(3), "margin_ratio": nan, "lp_rate": nan, "udd": np.zeros(3), "avail_margin": np.zeros(3)}
+    s = replay.summary(r)
+    assert s["max_margin_ratio"] == 0.0
+    assert s["max_margin_ratio_ts"] is None
+    assert math.isnan(s["max_lp_ratio"])
@@ -0,0 +1,26 @@
+import math
+
+from conftest import set_price
+from strat import risk
+
+
+def test_lp_rate_without_liquidation_price():
+    assert risk.lp_rate(16000.0, 20000.0, True) == 0.8
+    assert risk.lp_rate(25000.0, 20000.0, False) == 0.8
+    assert math.isnan(risk.lp_rate(0.0, 20000.0, False))
+    assert math.isnan(risk.lp_rate(float("nan"), 20000.0, True))
+
+
+def test_over_collateralised_short(make_routes, monkeypatch):
+    (btc,) = make_routes(("BTC",))
+    risk_point = risk.risk_point
+    monkeypatch.setattr(type(btc), "LP1", property(lambda self: 0.0))
+    monkeypatch.setattr(risk, "risk_point", lambda *args: {**risk_point(*args), "LP1": 0.0})
+    btc.position.qty = -0.1
+    btc.position.entry_price = 20000.0
+    set_price(btc, 20000.0)
+    btc.shared_vars["max_lp_ratio"] = 0.5
+
+    assert math.isnan(btc.lp_rate())
+    assert btc.shared_vars["max_lp_ratio"] == 0.5
+    assert math.isnan(btc.worst_case["lp_rate"])
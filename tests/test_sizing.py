@@ -0,0 +1,82 @@
+import random
+
+import numpy as np
+import pytest
+from jesse import utils
+
+from strat import sizing
+from strat.sizing import min_order_size
+
+
+def loop_min_order_size(price, min_qty, notional, step_size, precision, fee_rate):
+    """The original stepping loop of Strat.min_order_size."""
+    if min_qty * price >= notional:
+        cycle_pos_size = min_qty * price
+        fees = cycle_pos_size * fee_rate * 6
+        cycle_pos_size += fees
+        cycle_pos_size *= 1.05
+        qty = utils.size_to_qty(cycle_pos_size, price, precision=precision, fee_rate=fee_rate)
+        return qty, cycle_pos_size, fees, True
+
+    qty = utils.size_to_qty(notional, price, precision=precision, fee_rate=fee_rate)
+    while True:
+        qty += step_size
+        cycle_pos_size = qty * price
+        cycle_pos_size += cycle_pos_size * (fee_rate * 3)
+        if cycle_pos_size > notional:
+            fees = cycle_pos_size * (fee_rate * 6)
+            cycle_pos_size += fees
+            cycle_pos_size *= 1.05
+            qty = utils.size_to_qty(cycle_pos_size, price, precision=precision, fee_rate=fee_rate)
+            return qty, cycle_pos_size, fees, False
+
+
+RULES = [
+    # minQty, notional, stepSize, quantityPrecision
+    (0.001, 5.0, 0.001, 3),
+    (0.001, 100.0, 0.001, 3),
+    (0.01, 5.0, 0.01, 2),
+    (0.1, 5.0, 0.1, 1),
+    (1.0, 5.0, 1.0, 0),
+    (1.0, 10.0, 1.0, 0),
+    (0.0001, 5.0, 0.0001, 4),
+]
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_closed_form_matches_the_stepping_loop(seed):
+    rng = random.Random(seed)
+    for _ in range(5000):
+        min_qty, notional, step_size, precision = rng.choice(RULES)
+        fee_rate = rng.choice([0.0, 0.0002, 0.0004, 0.001])
+        price = 10 ** rng.uniform(-3, 5)
+        args = (price, min_qty, notional, step_size, precision, fee_rate)
+        qty, size, fees, by_qty = min_order_size(*args)
+        ref_qty, ref_size, ref_fees, ref_by_qty = loop_min_order_size(*args)
+
+        # Same order; sizes differ only by the float error the loop accumulates adding stepSize k times.
+        assert (qty, by_qty) == (ref_qty, ref_by_qty), args
+        assert size == pytest.approx(ref_size, rel=1e-12, abs=1e-12), args
+        assert fees == pytest.approx(ref_fees, rel=1e-12, abs=1e-12), args
+
+
+def test_prices_snap_to_the_tick_size():
+    # BTCUSDT: pricePrecision 2 but a tick of 0.10
+    q = sizing.Quantizer(0.001, 3, 2, 0.001, 5, tick_size=0.1)
+    prices = q.price([20123.456, 20123.44, 19999.96])
+    assert prices.tolist() == [20123.5, 20123.4, 20000.0]
+    units = np.round(prices * 100).astype(int)
+    assert (units % 10 == 0).all()
+
+    assert sizing.Quantizer(1, 0, 4, 1, 5, tick_size=0.0025).price([0.12345]).tolist() == [0.1225]
+    assert sizing.Quantizer(0.001, 3, 2, 0.001, 5).price([1.234]).tolist() == [1.23]
+
+
+def test_min_order_size_is_cached_per_rules_and_price():
+    min_order_size.cache_clear()
+    args = (0.0123, 1.0, 5.0, 1.0, 0, 0.0004)
+    first = min_order_size(*args)
+    assert min_order_size(*args) is first
+    min_order_size(0.0124, *args[1:])
+    info = min_order_size.cache_info()
+    assert (info.hits, info.misses) == (1, 2)